@@ -1,7 +1,7 @@
 import streamlit as st
 from auth import get_auth_url, exchange_code, save_credentials, get_credentials
 from utils import init_session
-from graph import run_agent
+import tracing
 import traceback
 
 # --------------------- Error UI Helpers ---------------------
@@ -32,9 +32,48 @@ def error_banner(text):
     )
 
 
+# --------------------- TRACE PANEL (optional) ---------------------
+def trace_panel():
+    """Sidebar view of the tracing data; only shown when ASSISTANT_TRACING=1."""
+    with st.sidebar:
+        st.subheader("⏱️ Tracing")
+        # Only this session's turn; spans from other users' sessions are never shown
+        spans = tracing.trace_spans(st.session_state.get("trace_id"))
+        if spans:
+            lines = []
+            for s in spans:
+                extras = " ".join(f"{k}={v}" for k, v in s.attrs.items())
+                flag = " ❌" if s.error else ""
+                lines.append(f"{'  ' * s.depth}{s.kind}:{s.name}  {s.duration * 1000:.0f} ms  {extras}{flag}")
+            st.caption("Last turn")
+            st.code("\n".join(lines), language=None)
+        else:
+            st.caption("No turns traced yet.")
+
+        # Process-wide aggregates cover every session: admins only (ASSISTANT_TRACE_ADMINS)
+        if not tracing.is_admin((st.session_state.get("profile") or {}).get("email")):
+            return
+        rows = tracing.summary()
+        if rows:
+            st.caption("All spans (all sessions)")
+            st.dataframe(rows, hide_index=True)
+        # API call layer and caches: counted even while span tracing is off
+        for component, rows in tracing.component_stats().items():
+            if rows:
+                st.caption(component.replace("_", " ").capitalize())
+                st.dataframe(rows, hide_index=True)
+        st.download_button("Download metrics (OpenMetrics)", tracing.export_openmetrics(),
+                           file_name="metrics.txt", mime="text/plain")
+        if st.button("Reset (all sessions)"):
+            tracing.reset()
+            st.rerun()
+
+
 # --------------------- PAGE SETUP ---------------------
 st.set_page_config(page_title="AI Personal Assistant", page_icon="🤖")
 init_session()
+# No-op unless ASSISTANT_METRICS_PORT is set; starts once per process
+tracing.start_metrics_server()
 
 st.markdown("""
 <style>
@@ -104,13 +143,29 @@ else:
         st.session_state["messages"].append(("🧑", prompt))
 
         with st.chat_message("assistant", avatar="🤖"):
-            with st.spinner("Processing..."):
-                try:
-                    response = run_agent(prompt)
-                    st.markdown(response)
-                    st.session_state["messages"].append(("🤖", response))
-
-                except Exception as e:
-                    tb = traceback.format_exc()
-                    error_banner("The assistant encountered an error.")
-                    show_error("Something went wrong while processing your request.", tb)
+            try:
+                # Deferred: the agent stack (LangChain, tools) is only loaded once someone chats
+                from graph import stream_agent
+                status = st.status("Processing...", expanded=False)
+
+                def answer_tokens():
+                    # Tokens go to the chat bubble, tool progress to the status box
+                    for event in stream_agent(prompt):
+                        if event[0] == "token":
+                            yield event[1]
+                        elif event[0] == "tool_start":
+                            status.update(label=f"Running `{event[1]}`...")
+                        elif event[0] == "tool_end":
+                            status.write(f"✅ `{event[1]}` finished in {event[2]:.1f}s")
+
+                response = st.write_stream(answer_tokens())
+                status.update(label="Done", state="complete")
+                st.session_state["messages"].append(("🤖", response))
+
+            except Exception as e:
+                tb = traceback.format_exc()
+                error_banner("The assistant encountered an error.")
+                show_error("Something went wrong while processing your request.", tb)
+
+    if tracing.is_enabled():
+        trace_panel()
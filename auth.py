@@ -1,9 +1,18 @@
 import streamlit as st
-from google_auth_oauthlib.flow import Flow
 from google.oauth2.credentials import Credentials
+import datetime
+import heapq
+import itertools
 import json
+import random
+import threading
+import time
 import warnings
+import weakref
+from google.auth.exceptions import RefreshError
 from google.auth.transport.requests import Request
+from google_clients import credential_key, execute, get_service, invalidate_services
+from tracing import span, traced
 
 
 # Redirect URI
@@ -35,6 +44,8 @@ def load_client_secrets():
 
 # Create OAuth flow
 def get_flow():
+    # Only needed on the login page; imported lazily to keep reruns cheap
+    from google_auth_oauthlib.flow import Flow
     return Flow.from_client_config(
         load_client_secrets(),
         scopes=SCOPES,
@@ -66,22 +77,194 @@ def exchange_code(code):
     return creds
 
 
-# Save credentials in session
+# Save credentials in session (and fetch the profile once, at login)
 def save_credentials(creds):
+    previous = st.session_state.get("cred_manager")
+    if previous is not None:
+        # A new login replaces the session's credentials; its old clients are dead weight
+        invalidate_services(previous.credentials)
     st.session_state["creds"] = json.loads(creds.to_json())
+    st.session_state["cred_manager"] = CredentialManager(creds)
+    st.session_state["creds_version"] = 0
+    try:
+        st.session_state["profile"] = _fetch_profile(creds)
+    except Exception:
+        pass  # get_user_name falls back to a neutral name and retries in the background
+
+
+# --- User Profile Cache ---
+PROFILE_TTL = 6 * 60 * 60   # seconds before the cached profile is refreshed (in the background)
+_REFRESHED_PROFILES = {}     # credential_key -> profile fetched by a background thread
+_REFRESHING = set()
+_PROFILE_LOCK = threading.Lock()
+
+def _fetch_profile(creds):
+    user_info = execute(get_service('oauth2', 'v2', creds).userinfo().get())
+    return {
+        "name": user_info.get('name', 'AI Assistant'),
+        "email": user_info.get('email'),
+        "fetched_at": time.time(),
+    }
+
+def _refresh_profile(creds, key):
+    try:
+        profile = _fetch_profile(creds)
+        with _PROFILE_LOCK:
+            _REFRESHED_PROFILES[key] = profile
+    except Exception:
+        pass
+    finally:
+        with _PROFILE_LOCK:
+            _REFRESHING.discard(key)
+
+def get_user_name(creds):
+    """
+    The user's real name for the email signature, from the session's cached profile.
+    Never blocks on the network: a missing or expired profile is refreshed on a
+    background thread and picked up on a later turn.
+    """
+    key = credential_key(creds)
+    with _PROFILE_LOCK:
+        fresher = _REFRESHED_PROFILES.pop(key, None)
+    if fresher:
+        st.session_state["profile"] = fresher
+
+    profile = st.session_state.get("profile")
+    if profile is None or time.time() - profile["fetched_at"] > PROFILE_TTL:
+        with _PROFILE_LOCK:
+            start = key not in _REFRESHING
+            _REFRESHING.add(key)
+        if start:
+            threading.Thread(target=_refresh_profile, args=(creds, key), daemon=True).start()
+
+    # Fall back to neutral name until the profile is known
+    return profile["name"] if profile else "AI Assistant"
+
+# --- Credential Manager ---
+REFRESH_MARGIN = 5 * 60     # refresh this many seconds before the token expires
+REFRESH_JITTER = 60         # random spread so sessions don't refresh in lockstep
+RETRY_DELAY = 30            # seconds before retrying a failed background refresh
+
+class CredentialManager:
+    """
+    Holds the single live Credentials object of one session. The token is
+    refreshed ahead of expiry by the shared background scheduler; concurrent
+    refresh attempts collapse into one call to the token endpoint.
+    """
+
+    def __init__(self, creds):
+        self.credentials = creds
+        self.version = 0            # bumped on every successful refresh
+        self.last_error = None
+        self._lock = threading.Lock()
+        _SCHEDULER.schedule(self, self._next_refresh_delay())
+
+    def _next_refresh_delay(self):
+        expiry = self.credentials.expiry  # naive UTC
+        if expiry is None:
+            return None
+        remaining = (expiry - datetime.datetime.utcnow()).total_seconds()
+        return max(1.0, remaining - REFRESH_MARGIN - random.uniform(0, REFRESH_JITTER))
+
+    def _needs_refresh(self, margin):
+        expiry = self.credentials.expiry
+        if not self.credentials.token:
+            return True
+        if expiry is None:
+            return False
+        return (expiry - datetime.datetime.utcnow()).total_seconds() < margin
+
+    def refresh(self, margin=REFRESH_MARGIN):
+        """Refresh if still needed. Callers that arrive mid-refresh wait and reuse its result."""
+        with self._lock:
+            if not self._needs_refresh(margin):
+                return
+            try:
+                with span("auth", "refresh"):
+                    self.credentials.refresh(Request())
+            except Exception as e:
+                self.last_error = e
+                _SCHEDULER.schedule(self, RETRY_DELAY)
+                raise
+            self.last_error = None
+            self.version += 1
+            # This session's pooled clients reconnect on the new token; other sessions keep theirs
+            invalidate_services(self.credentials)
+        _SCHEDULER.schedule(self, self._next_refresh_delay())
+
+
+class _RefreshScheduler:
+    """One daemon thread refreshing every session's token when it comes due."""
+
+    def __init__(self):
+        self._heap = []             # (due, seq, weakref to manager)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def schedule(self, manager, delay):
+        if delay is None:
+            return
+        with self._cond:
+            # Weak refs: a session that goes away takes its manager with it
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), weakref.ref(manager)))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                _, _, ref = heapq.heappop(self._heap)
+            manager = ref()
+            if manager is not None:
+                try:
+                    # Due times include jitter, so widen the margin by the same amount
+                    manager.refresh(margin=REFRESH_MARGIN + REFRESH_JITTER)
+                except Exception:
+                    pass  # retry already scheduled; get_credentials checks last_error
+
+
+_SCHEDULER = _RefreshScheduler()
+
 
 # Load credentials from session
+@traced("auth")
 def get_credentials():
-    if "creds" in st.session_state:
+    if "creds" not in st.session_state:
+        return None
+
+    manager = st.session_state.get("cred_manager")
+    if manager is None:
         creds = Credentials.from_authorized_user_info(st.session_state["creds"])
-        # Force refresh if expired
-        if creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(Request())  # from google.auth.transport.requests import Request
-                st.session_state["creds"] = json.loads(creds.to_json())
-            except Exception as e:
-                st.error(f"Failed to refresh credentials: {e}")
-                return None
-        return creds
-    return None
+        manager = st.session_state["cred_manager"] = CredentialManager(creds)
 
+    # A background refresh rejected by Google (revoked or expired grant) will
+    # never succeed on retry: drop the session's credentials and ask for a new login.
+    # Transient token-endpoint failures (5xx, timeouts) are marked retryable and
+    # keep the session; the scheduler tries again shortly.
+    error = manager.last_error
+    if isinstance(error, RefreshError) and not getattr(error, "retryable", False):
+        invalidate_services(manager.credentials)
+        for key in ("creds", "cred_manager", "creds_version"):
+            st.session_state.pop(key, None)
+        st.warning("Your Google sign-in has expired or was revoked. Please log in again.")
+        return None
+
+    creds = manager.credentials
+    # Normally the background refresh got here first; refresh inline only as a fallback
+    if not creds.valid and creds.refresh_token:
+        try:
+            manager.refresh()
+        except Exception as e:
+            st.error(f"Failed to refresh credentials: {e}")
+            return None
+
+    # Keep the serialized copy in session_state in step with the live object
+    if st.session_state.get("creds_version") != manager.version:
+        st.session_state["creds"] = json.loads(creds.to_json())
+        st.session_state["creds_version"] = manager.version
+    return creds
@@ -0,0 +1,237 @@
+"""
+Stress check: many concurrent sessions must only ever see their own user's
+credentials and data.
+
+    python benchmarks/credential_isolation.py --sessions 64 --turns 20
+
+Runs offline (FakeWorkspace and ScriptedChatModel), in two phases:
+
+  tools     parallel tool calls through LangGraph's ToolNode; each call
+            reports the credentials visible to it.
+  sessions  each session is its own user. It plants a private canary event
+            and file, then runs chat turns through graph.answer (router and
+            agent paths), so the real tools, the shared ServicePool and the
+            per-user caches are all in play. Every API request must go out on
+            a client built for the session's own user, no answer may contain
+            another session's canary, and the listing turns must show the
+            session's own.
+
+Exits with status 1 on any leak, any failed call, or fewer completed calls
+than expected.
+"""
+import argparse
+import datetime
+import random
+import sys
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+import offline  # noqa: F401  (sets up paths and the cache dir first)
+from offline import fake_credentials, setup
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+from langgraph.graph import END, START, MessagesState, StateGraph
+from langgraph.prebuilt import ToolNode
+
+from google_clients import credential_key, set_transport_factory
+from tools_google import get_safe_creds, user_credentials
+
+# Turns each session cycles through; the first two list the canaries
+SESSION_TURNS = [
+    "show my next 3 events",
+    "find files named canary",
+    "emails from alice",
+    "give me my morning briefing",
+    "summarize the budget file",
+]
+CANARY_TURNS = {
+    "show my next 3 events": "event",
+    "find files named canary": "file",
+}
+
+
+class Report:
+    """Thread-safe tally of completed calls, leaks and failures."""
+
+    def __init__(self):
+        self.completed = 0
+        self.requests = 0
+        self.leaks = []
+        self.failures = []
+        self._lock = threading.Lock()
+
+    def done(self, count=1):
+        with self._lock:
+            self.completed += count
+
+    def leak(self, *detail):
+        with self._lock:
+            self.leaks.append(detail)
+
+    def fail(self, session_id, error):
+        with self._lock:
+            self.failures.append((session_id, f"{type(error).__name__}: {error}"))
+
+    def request(self):
+        with self._lock:
+            self.requests += 1
+
+
+# ==========================
+# Phase 1: ToolNode
+# ==========================
+
+@tool
+def whoami(delay_ms: int = 0):
+    """Return the refresh token of the credentials visible to this tool call."""
+    time.sleep(delay_ms / 1000)
+    return get_safe_creds().refresh_token
+
+
+def tool_graph():
+    """ToolNode needs a graph runtime: wrap it in a one-node graph."""
+    builder = StateGraph(MessagesState)
+    builder.add_node("tools", ToolNode([whoami]))
+    builder.add_edge(START, "tools")
+    builder.add_edge("tools", END)
+    return builder.compile()
+
+
+def run_tool_session(session_id, turns, calls_per_turn, node, report):
+    creds = SimpleNamespace(refresh_token=f"session-{session_id}", client_id="stress", token=None)
+    config = {"configurable": {"thread_id": f"tools-{session_id}"}}
+    try:
+        for turn in range(turns):
+            calls = [
+                {"name": "whoami", "args": {"delay_ms": random.randint(0, 5)}, "id": f"{session_id}-{turn}-{i}"}
+                for i in range(calls_per_turn)
+            ]
+            with user_credentials(creds, session=config["configurable"]["thread_id"]):
+                result = node.invoke({"messages": [AIMessage(content="", tool_calls=calls)]}, config=config)
+            replies = result["messages"][1:]
+            for message in replies:
+                if message.content != creds.refresh_token:
+                    report.leak(session_id, "tool call", message.content)
+            report.done(len(replies))
+    except Exception as e:
+        report.fail(session_id, e)
+
+
+# ==========================
+# Phase 2: chat sessions
+# ==========================
+
+class _CheckedHttp:
+    """Transport that flags requests sent on another user's client."""
+
+    def __init__(self, http, credentials, report):
+        self._http = http
+        self.credentials = credentials
+        self._owner = credential_key(credentials)
+        self._report = report
+
+    def request(self, *args, **kwargs):
+        try:
+            caller = credential_key(get_safe_creds())
+        except ValueError:
+            caller = None   # background work (e.g. an index crawl), bound to no session
+        if caller is not None:
+            self._report.request()
+            if caller != self._owner:
+                self._report.leak(caller, "api client", self._owner)
+        return self._http.request(*args, **kwargs)
+
+
+def plant_canaries(tag, creds, thread_id):
+    """A private event (starting soon) and file named after `tag`."""
+    import graph
+    soon = datetime.datetime.utcnow() + datetime.timedelta(minutes=10)
+    with user_credentials(creds, session=thread_id):
+        graph.TOOLS_BY_NAME["create_event"].invoke(
+            {"title": f"Canary {tag}", "date": soon.strftime("%Y-%m-%d"), "time": soon.strftime("%H:%M")})
+        graph.TOOLS_BY_NAME["drive_upload"].invoke(
+            {"file_name": f"canary-{tag}.txt", "content": f"canary for {tag}"})
+
+
+def run_chat_session(session_id, turns, tags, report):
+    import graph
+    tag = tags[session_id]
+    others = [t for i, t in enumerate(tags) if i != session_id]
+    creds = fake_credentials(f"isolation-{session_id}")
+    thread_id = uuid.uuid4().hex
+    try:
+        plant_canaries(tag, creds, thread_id)
+        for turn in range(turns):
+            prompt = SESSION_TURNS[turn % len(SESSION_TURNS)]
+            text = graph.answer(prompt, creds, thread_id=thread_id)
+            seen = [t for t in others if t in text]
+            if seen:
+                report.leak(session_id, prompt, seen)
+            if prompt in CANARY_TURNS and tag not in text:
+                report.leak(session_id, prompt, f"own canary {CANARY_TURNS[prompt]} missing")
+            report.done()
+    except Exception as e:
+        report.fail(session_id, e)
+
+
+def run_threads(target, sessions, *args):
+    threads = [threading.Thread(target=target, args=(i, *args)) for i in range(sessions)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - t0
+
+
+def check(name, report, expected):
+    """Print the phase's outcome; True if it passed."""
+    print(f"{name}: {report.completed}/{expected} calls completed"
+          + (f", {report.requests} API requests checked" if report.requests else ""))
+    ok = True
+    if report.failures:
+        print(f"  FAIL: {len(report.failures)} sessions raised, e.g. {report.failures[:3]}")
+        ok = False
+    if report.leaks:
+        print(f"  FAIL: {len(report.leaks)} leaks, e.g. {report.leaks[:5]}")
+        ok = False
+    if report.completed != expected:
+        print(f"  FAIL: expected {expected} completed calls")
+        ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--calls", type=int, default=4, help="parallel tool calls per ToolNode turn")
+    args = parser.parse_args()
+
+    workspace, _ = setup()
+    chat = Report()
+    set_transport_factory(lambda credentials: _CheckedHttp(workspace.http(credentials), credentials, chat))
+
+    tools = Report()
+    elapsed = run_threads(run_tool_session, args.sessions, args.turns, args.calls, tool_graph(), tools)
+    print(f"tools phase: {args.sessions} sessions in {elapsed:.2f}s")
+    ok = check("tools", tools, args.sessions * args.turns * args.calls)
+
+    tags = [uuid.uuid4().hex[:12] for _ in range(args.sessions)]
+    elapsed = run_threads(run_chat_session, args.sessions, args.turns, tags, chat)
+    print(f"sessions phase: {args.sessions} sessions in {elapsed:.2f}s")
+    ok = check("sessions", chat, args.sessions * args.turns) and ok
+    if not chat.requests:
+        print("  FAIL: no API requests were checked")
+        ok = False
+
+    if not ok:
+        sys.exit(1)
+    print("OK: no cross-session credential or data leakage")
+
+
+if __name__ == "__main__":
+    main()
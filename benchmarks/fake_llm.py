@@ -0,0 +1,131 @@
+"""
+Scripted stand-in for the Gemini chat model.
+
+Each user message is matched against SCRIPTS; the matching script lists the
+tool calls to emit step by step (a step with several calls runs them in
+parallel), then a final answer. Arguments can be computed from the tool
+outputs seen so far in the turn, e.g. the id of the first file listed.
+"""
+import re
+import threading
+import time
+import uuid
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import Field
+
+from formatting import parse_table
+
+
+def first_id(outputs):
+    """Id column of the first row of the most recent table output."""
+    for output in reversed(outputs):
+        rows = parse_table(output)
+        if rows and "id" in rows[0]:
+            return rows[0]["id"]
+    return "missing"
+
+
+def first_file(outputs):
+    for output in reversed(outputs):
+        for row in parse_table(output) or []:
+            if row.get("kind") == "file":
+                return row["id"]
+    return "missing"
+
+
+# (pattern, [step, ...]); a step is a list of (tool, args | callable(outputs) -> args)
+SCRIPTS = [
+    (r"next (\d+) events", [
+        [("get_upcoming_events", lambda outputs, m: {"n": int(m.group(1))})],
+    ]),
+    (r"summari[sz]e (?:the )?(\w+) (?:file|doc)", [
+        [("list_files", lambda outputs, m: {"query": m.group(1)})],
+        [("read_file_content", lambda outputs, m: {"file_id": first_file(outputs)})],
+    ]),
+    (r"what does (?:the )?(\w+) (?:file|doc) say about (.+)", [
+        [("list_files", lambda outputs, m: {"query": m.group(1)})],
+        [("search_file_content", lambda outputs, m: {"file_id": first_file(outputs), "question": m.group(2)})],
+    ]),
+    (r"emails? from (\w+)", [
+        [("search_emails", lambda outputs, m: {"query": f"from:{m.group(1)}", "n": 10})],
+    ]),
+    (r"briefing", [
+        [("get_upcoming_events", {"n": 5}),
+         ("search_emails", {"query": "is:unread", "n": 10}),
+         ("list_files", {"n": 10})],
+    ]),
+    (r"note to (\d+) people", [
+        [("bulk_create_email_drafts", lambda outputs, m: {
+            "recipients": [f"person{i}@example.com" for i in range(int(m.group(1)))],
+            "subject": "Note", "body": "Dear {recipient},\n\nA short note.\n",
+        })],
+    ]),
+    (r"draft .*to (\w+)", [
+        [("search_emails", lambda outputs, m: {"query": f"from:{m.group(1)}", "n": 3})],
+        [("create_email_draft", lambda outputs, m: {
+            "to": f"{m.group(1)}@example.com", "subject": "Follow-up", "body": "Dear colleague,\n\nFollowing up.\n"
+        })],
+    ]),
+]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Deterministic chat model: tool calls from SCRIPTS, optional think time per call
+    (seconds, or a callable drawing one)."""
+
+    think_time: Any = 0.0
+    scripts: list = Field(default_factory=lambda: list(SCRIPTS))
+    stats: dict = Field(default_factory=lambda: {"calls": 0, "prompt_chars": 0, "max_prompt_chars": 0})
+    lock: Any = Field(default_factory=threading.Lock, exclude=True)
+
+    @property
+    def _llm_type(self):
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _record(self, messages):
+        size = sum(len(str(m.content)) + len(str(getattr(m, "tool_calls", "") or "")) for m in messages)
+        with self.lock:
+            self.stats["calls"] += 1
+            self.stats["prompt_chars"] += size
+            self.stats["max_prompt_chars"] = max(self.stats["max_prompt_chars"], size)
+
+    def _reply(self, messages):
+        last = messages[-1]
+        # memory.py's summarizer
+        if isinstance(last, HumanMessage) and str(last.content).startswith("Summarize the conversation"):
+            return AIMessage(content="Earlier the user asked about their files, mail and calendar.")
+
+        start = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+        turn = messages[start + 1:]
+        steps_done = sum(1 for m in turn if isinstance(m, AIMessage))
+        outputs = [str(m.content) for m in turn if isinstance(m, ToolMessage)]
+        text = str(messages[start].content).lower()
+
+        for pattern, steps in self.scripts:
+            match = re.search(pattern, text)
+            if match and steps_done < len(steps):
+                calls = []
+                for name, args in steps[steps_done]:
+                    if callable(args):
+                        args = args(outputs, match)
+                    calls.append({"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:12]}"})
+                return AIMessage(content="", tool_calls=calls)
+            if match:
+                break
+
+        summary = outputs[-1][:500] if outputs else "I can help with your email, calendar and files."
+        return AIMessage(content=f"Here is what I found:\n{summary}")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._record(messages)
+        delay = self.think_time() if callable(self.think_time) else self.think_time
+        if delay:
+            time.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
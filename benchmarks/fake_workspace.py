@@ -0,0 +1,512 @@
+"""
+In-process fake of the Gmail, Drive, Calendar and oauth2 endpoints the app uses.
+
+    workspace = FakeWorkspace(latency=0.05)
+    google_clients.set_transport_factory(workspace.http)
+
+Requests made by googleapiclient (including batch and media up/downloads) are
+answered from deterministic, seeded in-memory data. Every request is counted
+(per endpoint, plus bytes in/out), and an optional per-request latency
+(seconds, or a callable drawing one) and error rate model the network.
+"""
+import email.parser
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from urllib.parse import parse_qs, urlsplit
+
+import httplib2
+
+_WORDS = (
+    "budget project meeting report quarterly review design roadmap hiring launch "
+    "invoice contract customer team plan notes draft update summary research "
+    "travel offsite metrics revenue forecast security release incident api"
+).split()
+_PEOPLE = ["alice", "bob", "carol", "dave", "erin", "frank", "grace", "heidi"]
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+GOOGLE_DOC_MIME = "application/vnd.google-apps.document"
+
+
+class _Error(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _account(headers):
+    """Account id of a request, derived from its bearer token (see _FakeHttp)."""
+    token = headers.get("authorization", "")
+    return hashlib.sha1(token.encode()).hexdigest()[:20]
+
+
+def _response(status, body=b"", headers=None):
+    resp = httplib2.Response({"status": str(status), "content-type": "application/json", **(headers or {})})
+    if isinstance(body, (dict, list)):
+        body = json.dumps(body).encode()
+    elif isinstance(body, str):
+        body = body.encode()
+    return resp, body
+
+
+class FakeWorkspace:
+    """
+    Seeded data shared by every user/credential that connects; each access
+    token is its own account (see _about), so per-user state stays per user.
+    Events and files created through the API are private to the account that
+    created them, which lets a benchmark plant per-user canaries.
+    """
+
+    def __init__(self, emails=300, files=400, events=200, doc_chars=20000,
+                 latency=0.0, error_rate=0.0, seed=7):
+        self.latency = latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = Counter()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.errors_injected = 0
+        self.connections = 0
+        self._version = 1
+        self._uploads = {}
+        self.drafts = {}
+        self._lost_replies = Counter()   # route name -> applied calls still to answer with 503
+        self._seed(emails, files, events, doc_chars)
+        self._routes = [
+            ("GET", r"/oauth2/v2/userinfo$", self._userinfo),
+            # Gmail
+            ("GET", r"/gmail/v1/users/me/profile$", self._gmail_profile),
+            ("GET", r"/gmail/v1/users/me/labels$", self._gmail_labels),
+            ("GET", r"/gmail/v1/users/me/history$", self._gmail_history),
+            ("GET", r"/gmail/v1/users/me/messages$", self._gmail_list),
+            ("GET", r"/gmail/v1/users/me/messages/([^/]+)$", self._gmail_get),
+            ("POST", r"/gmail/v1/users/me/messages/send$", self._gmail_send),
+            ("POST", r"/gmail/v1/users/me/drafts$", self._gmail_draft),
+            # Calendar
+            ("GET", r"/calendar/v3/calendars/primary/events$", self._events_list),
+            ("POST", r"/calendar/v3/calendars/primary/events$", self._events_insert),
+            ("DELETE", r"/calendar/v3/calendars/primary/events/([^/]+)$", self._events_delete),
+            # Drive
+            ("GET", r"/drive/v3/about$", self._about),
+            ("GET", r"/drive/v3/changes/startPageToken$", self._changes_start),
+            ("GET", r"/drive/v3/changes$", self._changes_list),
+            ("GET", r"/drive/v3/files$", self._files_list),
+            ("GET", r"/drive/v3/files/([^/]+)/export$", self._files_export),
+            ("GET", r"/drive/v3/files/([^/]+)$", self._files_get),
+            ("POST", r"/upload/drive/v3/files$", self._files_upload),
+            ("PUT", r"/upload/drive/v3/files$", self._files_upload_chunk),
+        ]
+
+    # --- seed data ---
+    def _text(self, chars):
+        words, size = [], 0
+        while size < chars:
+            word = self._rng.choice(_WORDS)
+            words.append(word + ("." if self._rng.random() < 0.08 else ""))
+            size += len(word) + 1
+        return " ".join(words)[:chars]
+
+    def _seed(self, emails, files, events, doc_chars):
+        now = time.time()
+        self.messages = {}
+        for i in range(emails):
+            sender = self._rng.choice(_PEOPLE)
+            msg_id = f"m{i:05d}"
+            self.messages[msg_id] = {
+                "id": msg_id,
+                "threadId": f"t{i:05d}",
+                "labelIds": ["INBOX"] + (["UNREAD"] if i % 3 == 0 else []),
+                "internalDate": str(int((now - i * 3600) * 1000)),
+                "snippet": self._text(160),
+                "from": f"{sender.title()} <{sender}@example.com>",
+                "subject": " ".join(self._rng.sample(_WORDS, 3)).title(),
+            }
+        self.files = {}
+        for i in range(files):
+            folder = i % 10 == 0
+            file_id = f"f{i:05d}"
+            mime = FOLDER_MIME if folder else (GOOGLE_DOC_MIME if i % 2 else "text/plain")
+            content = b"" if folder else self._text(doc_chars).encode()
+            self.files[file_id] = {
+                "meta": {
+                    "id": file_id,
+                    "name": " ".join(self._rng.sample(_WORDS, 2)).title() + ("" if folder else f" {i}"),
+                    "mimeType": mime,
+                    "parents": ["root"],
+                    "modifiedTime": "2026-01-01T00:00:00.000Z",
+                    "ownedByMe": True,
+                    "md5Checksum": uuid.UUID(int=self._rng.getrandbits(128)).hex,
+                    "headRevisionId": "r1",
+                    "size": str(len(content)),
+                },
+                "content": content,
+                "version": 1,
+            }
+        self.events = {}
+        for i in range(events):
+            start = now + (i - events // 4) * 6 * 3600
+            event_id = f"e{i:05d}"
+            self.events[event_id] = {
+                "event": {
+                    "id": event_id,
+                    "status": "confirmed",
+                    "summary": " ".join(self._rng.sample(_WORDS, 2)).title(),
+                    "start": {"dateTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(start))},
+                    "end": {"dateTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(start + 1800))},
+                },
+                "version": 1,
+            }
+
+    # --- transport ---
+    def http(self, credentials=None):
+        """Transport factory for google_clients.set_transport_factory."""
+        with self._lock:
+            self.connections += 1
+        return _FakeHttp(self, credentials)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "total_calls": sum(self.calls.values()),
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "errors_injected": self.errors_injected,
+                "connections": self.connections,
+            }
+
+    def fail_after_apply(self, route, times=1):
+        """The next `times` calls to `route` take effect but are answered 503 (a write whose reply was lost)."""
+        with self._lock:
+            self._lost_replies[route] += times
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls.clear()
+            self.bytes_in = self.bytes_out = self.errors_injected = 0
+
+    def handle(self, uri, method="GET", body=None, headers=None):
+        body = body or b""
+        if hasattr(body, "read"):
+            # Resumable chunks from a stream arrive as a file-like slice
+            body = body.read()
+        if isinstance(body, str):
+            body = body.encode()
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        delay = self.latency() if callable(self.latency) else self.latency
+        if delay:
+            time.sleep(delay)
+
+        parts = urlsplit(uri)
+        # Newer googleapiclient versions post to /batch, older ones to /batch/<api>/<version>
+        if parts.path == "/batch" or parts.path.startswith("/batch/"):
+            resp, content = self._batch(body, headers)
+            name = "batch"
+        else:
+            name, resp, content = self._dispatch(method, parts, body, headers)
+        with self._lock:
+            self.calls[name] += 1
+            self.bytes_in += len(body)
+            self.bytes_out += len(content)
+        return resp, content
+
+    def _dispatch(self, method, parts, body, headers):
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        for route_method, pattern, handler in self._routes:
+            match = re.search(pattern, parts.path)
+            if route_method == method and match:
+                name = handler.__name__.lstrip("_")
+                if self.error_rate and self._rng.random() < self.error_rate:
+                    with self._lock:
+                        self.errors_injected += 1
+                    return name, *_response(503, {"error": {"code": 503, "message": "Backend Error"}})
+                try:
+                    result = handler(query, body, headers, *match.groups())
+                    with self._lock:
+                        lost = self._lost_replies[name] > 0
+                        if lost:
+                            self._lost_replies[name] -= 1
+                            self.errors_injected += 1
+                    if lost:
+                        return name, *_response(503, {"error": {"code": 503, "message": "Backend Error"}})
+                    return name, *result
+                except _Error as e:
+                    return name, *_response(e.status, {"error": {"code": e.status, "message": str(e)}})
+        return "unknown", *_response(404, {"error": {"code": 404, "message": f"No route for {method} {parts.path}"}})
+
+    def _batch(self, body, headers):
+        envelope = f"content-type: {headers['content-type']}\r\n\r\n".encode() + body
+        request = email.parser.BytesParser().parsebytes(envelope)
+        boundary = f"batch_{uuid.uuid4().hex}"
+        out = []
+        for part in request.get_payload():
+            raw = part.get_payload()
+            head, _, sub_body = raw.replace("\r\n", "\n").partition("\n\n")
+            request_line, *header_lines = head.split("\n")
+            sub_method, path, _ = request_line.split(" ", 2)
+            sub_headers = {k.lower(): v for k, v in (line.split(": ", 1) for line in header_lines if ": " in line)}
+            # Sub-requests run as the account that sent the batch
+            sub_headers.setdefault("authorization", headers.get("authorization", ""))
+            name, resp, content = self._dispatch(sub_method, urlsplit(path), sub_body.encode(), sub_headers)
+            with self._lock:
+                self.calls[name] += 1
+            out.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{part['Content-ID'][1:-1]}>\r\n\r\n"
+                f"HTTP/1.1 {resp.status} OK\r\nContent-Type: application/json\r\n\r\n"
+                f"{content.decode()}\r\n"
+            )
+        out.append(f"--{boundary}--")
+        return _response(200, "".join(out), {"content-type": f"multipart/mixed; boundary={boundary}"})
+
+    def _bump(self):
+        with self._lock:
+            self._version += 1
+            return self._version
+
+    # --- oauth2 ---
+    def _userinfo(self, query, body, headers):
+        return _response(200, {"name": "Bench User", "email": f"{_account(headers)}@example.com"})
+
+    # --- gmail ---
+    def _gmail_profile(self, query, body, headers):
+        return _response(200, {"emailAddress": f"{_account(headers)}@example.com", "historyId": str(self._version)})
+
+    def _gmail_labels(self, query, body, headers):
+        return _response(200, {"labels": [{"id": "INBOX", "name": "INBOX"}, {"id": "UNREAD", "name": "UNREAD"}]})
+
+    def _gmail_history(self, query, body, headers):
+        return _response(200, {"history": [], "historyId": str(self._version)})
+
+    def _matches(self, msg, q):
+        for term in (q or "").lower().split():
+            field, _, value = term.partition(":")
+            if not value:
+                haystack, value = f"{msg['from']} {msg['subject']} {msg['snippet']}".lower(), field
+            elif field == "from":
+                haystack = msg["from"].lower()
+            elif field == "subject":
+                haystack = msg["subject"].lower()
+            elif field in ("label", "in", "is"):
+                haystack, value = " ".join(msg["labelIds"]).lower(), value
+            else:
+                continue
+            if value not in haystack:
+                return False
+        return True
+
+    def _gmail_list(self, query, body, headers):
+        hits = [m for m in self.messages.values() if self._matches(m, query.get("q"))]
+        start = int(query.get("pageToken", 0))
+        size = int(query.get("maxResults", 100))
+        page = hits[start:start + size]
+        result = {"messages": [{"id": m["id"], "threadId": m["threadId"]} for m in page],
+                  "resultSizeEstimate": len(hits)}
+        if start + size < len(hits):
+            result["nextPageToken"] = str(start + size)
+        if not page:
+            del result["messages"]
+        return _response(200, result)
+
+    def _gmail_get(self, query, body, headers, msg_id):
+        msg = self.messages.get(msg_id)
+        if msg is None:
+            raise _Error(404, "Requested entity was not found.")
+        return _response(200, {
+            "id": msg["id"],
+            "threadId": msg["threadId"],
+            "labelIds": msg["labelIds"],
+            "internalDate": msg["internalDate"],
+            "snippet": msg["snippet"],
+            "payload": {
+                "mimeType": "text/plain",
+                "headers": [{"name": "From", "value": msg["from"]},
+                            {"name": "Subject", "value": msg["subject"]}],
+                "body": {"size": len(msg["snippet"])},
+            },
+        })
+
+    def _gmail_send(self, query, body, headers):
+        self._bump()
+        return _response(200, {"id": f"s{uuid.uuid4().hex[:12]}", "labelIds": ["SENT"]})
+
+    def _gmail_draft(self, query, body, headers):
+        self._bump()
+        draft = {"id": f"d{uuid.uuid4().hex[:12]}", "message": {"id": uuid.uuid4().hex[:12]}}
+        with self._lock:
+            self.drafts[draft["id"]] = body
+        return _response(200, draft)
+
+    @staticmethod
+    def _visible(entry, headers):
+        return entry.get("owner") in (None, _account(headers))
+
+    # --- calendar ---
+    def _events_list(self, query, body, headers):
+        events = [e for e in list(self.events.values()) if self._visible(e, headers)]
+        if "syncToken" in query:
+            since = int(query["syncToken"])
+            items = [e["event"] for e in events if e["version"] > since]
+            return _response(200, {"items": items, "nextSyncToken": str(self._version)})
+
+        items = [e["event"] for e in events if e["event"]["status"] != "cancelled"]
+        if "timeMin" in query:
+            items = [e for e in items if e["end"]["dateTime"] > query["timeMin"][:19]]
+        if "timeMax" in query:
+            items = [e for e in items if e["start"]["dateTime"] < query["timeMax"][:19]]
+        items.sort(key=lambda e: e["start"]["dateTime"])
+        start = int(query.get("pageToken", 0))
+        size = int(query.get("maxResults", 250))
+        result = {"items": items[start:start + size]}
+        if start + size < len(items):
+            result["nextPageToken"] = str(start + size)
+        else:
+            result["nextSyncToken"] = str(self._version)
+        return _response(200, result)
+
+    def _events_insert(self, query, body, headers):
+        event = json.loads(body)
+        event.update(id=f"e{uuid.uuid4().hex[:12]}", status="confirmed",
+                     htmlLink="https://calendar.example.com/event")
+        for edge in ("start", "end"):
+            event[edge] = {"dateTime": event[edge]["dateTime"][:19] + "Z"}
+        self.events[event["id"]] = {"event": event, "version": self._bump(), "owner": _account(headers)}
+        return _response(200, event)
+
+    def _events_delete(self, query, body, headers, event_id):
+        entry = self.events.get(event_id)
+        if entry is None or not self._visible(entry, headers) or entry["event"]["status"] == "cancelled":
+            raise _Error(410, "Resource has been deleted")
+        entry["event"] = {"id": event_id, "status": "cancelled"}
+        entry["version"] = self._bump()
+        return _response(204, b"")
+
+    # --- drive ---
+    def _about(self, query, body, headers):
+        # One account per access token, so each simulated user gets their own index
+        return _response(200, {"user": {"permissionId": _account(headers)}})
+
+    def _changes_start(self, query, body, headers):
+        return _response(200, {"startPageToken": str(self._version)})
+
+    def _changes_list(self, query, body, headers):
+        since = int(query["pageToken"])
+        changes = [{"fileId": f["meta"]["id"], "removed": False, "file": f["meta"]}
+                   for f in list(self.files.values()) if f["version"] > since and self._visible(f, headers)]
+        return _response(200, {"changes": changes, "newStartPageToken": str(self._version)})
+
+    def _files_list(self, query, body, headers):
+        items = [f["meta"] for f in list(self.files.values()) if self._visible(f, headers)]
+        match = re.search(r"name contains '([^']*)'", query.get("q", ""))
+        if match:
+            items = [m for m in items if match.group(1).lower() in m["name"].lower()]
+        items.sort(key=lambda m: (m["mimeType"] != FOLDER_MIME, m["name"].lower()))
+        start = int(query.get("pageToken", 0))
+        size = int(query.get("pageSize", 100))
+        result = {"files": items[start:start + size]}
+        if start + size < len(items):
+            result["nextPageToken"] = str(start + size)
+        return _response(200, result)
+
+    def _file(self, file_id, headers):
+        entry = self.files.get(file_id)
+        if entry is None or not self._visible(entry, headers):
+            raise _Error(404, f"File not found: {file_id}")
+        return entry
+
+    def _media(self, content, headers):
+        match = re.match(r"bytes=(\d+)-(\d+)", headers.get("range", ""))
+        if not match:
+            return _response(200, content, {"content-type": "application/octet-stream",
+                                            "content-length": str(len(content))})
+        first, last = int(match.group(1)), min(int(match.group(2)), len(content) - 1)
+        return _response(206, content[first:last + 1], {
+            "content-type": "application/octet-stream",
+            "content-range": f"bytes {first}-{last}/{len(content)}",
+        })
+
+    def _files_get(self, query, body, headers, file_id):
+        entry = self._file(file_id, headers)
+        if query.get("alt") == "media":
+            if entry["meta"]["mimeType"].startswith("application/vnd.google-apps"):
+                raise _Error(403, "Only files with binary content can be downloaded. Use Export.")
+            return self._media(entry["content"], headers)
+        return _response(200, entry["meta"])
+
+    def _files_export(self, query, body, headers, file_id):
+        entry = self._file(file_id, headers)
+        if entry["meta"]["mimeType"] != GOOGLE_DOC_MIME:
+            raise _Error(403, "Export only supports Docs Editors files.")
+        return self._media(entry["content"], headers)
+
+    def _store_upload(self, metadata, content, headers):
+        file_id = f"u{uuid.uuid4().hex[:12]}"
+        meta = {
+            "id": file_id,
+            "name": metadata.get("name", "Untitled"),
+            "mimeType": metadata.get("mimeType", "application/octet-stream"),
+            "parents": metadata.get("parents", ["root"]),
+            "modifiedTime": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+            "ownedByMe": True,
+            "size": str(len(content)),
+        }
+        self.files[file_id] = {"meta": meta, "content": content, "version": self._bump(),
+                               "owner": _account(headers)}
+        return _response(200, meta)
+
+    def _files_upload(self, query, body, headers):
+        upload_type = query.get("uploadType")
+        if upload_type == "resumable":
+            session = uuid.uuid4().hex
+            self._uploads[session] = {"metadata": json.loads(body or b"{}"), "content": bytearray()}
+            location = f"https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable&upload_id={session}"
+            return _response(200, b"", {"location": location})
+        if upload_type == "multipart":
+            envelope = f"content-type: {headers['content-type']}\r\n\r\n".encode() + body
+            message = email.parser.BytesParser().parsebytes(envelope)
+            meta_part, media_part = message.get_payload()
+            return self._store_upload(json.loads(meta_part.get_payload()),
+                                      media_part.get_payload(decode=True) or b"", headers)
+        return self._store_upload({}, body, headers)
+
+    def _files_upload_chunk(self, query, body, headers):
+        upload = self._uploads.get(query.get("upload_id"))
+        if upload is None:
+            raise _Error(404, "Upload session not found")
+        match = re.match(r"bytes (\d+)-(\d+)/(\d+|\*)", headers.get("content-range", ""))
+        if match:
+            first = int(match.group(1))
+            # A resent chunk overwrites whatever we already had from that offset
+            del upload["content"][first:]
+            upload["content"].extend(body)
+            total = match.group(3)
+        else:
+            total = headers.get("content-range", "bytes */*").rsplit("/", 1)[1]
+        received = len(upload["content"])
+        if total != "*" and received >= int(total):
+            del self._uploads[query["upload_id"]]
+            return self._store_upload(upload["metadata"], bytes(upload["content"]), headers)
+        extra = {"range": f"bytes=0-{received - 1}"} if received else {}
+        return _response(308, b"", extra)
+
+
+class _FakeHttp:
+    """httplib2.Http look-alike bound to one set of credentials."""
+
+    def __init__(self, workspace, credentials):
+        self.workspace = workspace
+        self.credentials = credentials
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        # Authorize like google_auth_httplib2.AuthorizedHttp, so the fake can tell users apart
+        headers = dict(headers or {})
+        token = getattr(self.credentials, "token", None)
+        if token:
+            headers["authorization"] = f"Bearer {token}"
+        return self.workspace.handle(uri, method, body, headers)
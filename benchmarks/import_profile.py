@@ -0,0 +1,97 @@
+"""
+Startup profiler: import-time breakdown of the app's modules.
+
+    python benchmarks/import_profile.py                  # table of the slowest imports
+    python benchmarks/import_profile.py --max-ms 1500    # CI gate: exit 1 if over budget
+    python benchmarks/import_profile.py --json out.json  # machine-readable result
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter,
+so nothing already imported by this process skews the numbers.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile(module):
+    """
+    Returns (total_us, {top_level_package: (cumulative_us, self_us)}, [(cumulative_us, module)]).
+    A package's cumulative time counts its outermost imports in the tree (with
+    whatever they pulled in); nested imports of the same package are inside those.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        sys.exit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            # One space at the top level, two more per level of nesting
+            entries.append(((len(indent) - 1) // 2, name, int(self_us), int(cumulative_us)))
+
+    cumulative, own = defaultdict(int), defaultdict(int)
+    total = 0
+    # -X importtime prints a module after its imports; reversed, every parent
+    # comes before its children and a stack holds the current import chain
+    chain = []
+    for depth, name, self_us, cumulative_us in reversed(entries):
+        package = name.split(".")[0]
+        del chain[depth:]
+        if package not in chain:
+            cumulative[package] += cumulative_us
+        own[package] += self_us
+        if depth == 0:
+            total += cumulative_us
+        chain.append(package)
+
+    packages = {name: (cumulative[name], own[name]) for name in cumulative}
+    modules = sorted(((us, name) for _, name, _, us in entries), reverse=True)
+    return total, packages, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time breakdown")
+    parser.add_argument("--module", default="graph", help="module to import (default: graph)")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if total import time exceeds this")
+    parser.add_argument("--json", default=None, help="write results to this file")
+    args = parser.parse_args()
+
+    total, packages, modules = profile(args.module)
+
+    print(f"import {args.module}: {total / 1000:.1f} ms\n")
+    print(f"{'package':<32}{'cumulative ms':>15}{'self ms':>10}")
+    for name, (us, self_us) in sorted(packages.items(), key=lambda kv: -kv[1][0])[:args.top]:
+        print(f"{name:<32}{us / 1000:>15.1f}{self_us / 1000:>10.1f}")
+    print(f"\n{'slowest modules (cumulative)':<48}{'ms':>10}")
+    for us, name in modules[:args.top]:
+        print(f"{name:<48}{us / 1000:>10.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "module": args.module,
+                "total_ms": total / 1000,
+                "packages_ms": {k: {"cumulative": us / 1000, "self": self_us / 1000}
+                                for k, (us, self_us) in packages.items()},
+            }, f, indent=2)
+
+    if args.max_ms is not None and total / 1000 > args.max_ms:
+        print(f"\nFAIL: {total / 1000:.1f} ms exceeds budget of {args.max_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Multi-session load test: how many concurrent chat sessions one process sustains.
+
+    python benchmarks/load_test.py                                   # ramp 1,2,4,...,32 sessions
+    python benchmarks/load_test.py --levels 8,16,64 --duration 20
+    python benchmarks/load_test.py --api-latency lognormal:0.08:0.6 --llm-latency lognormal:0.9:0.4
+    python benchmarks/load_test.py --slo-p95 5 --json load.json
+
+Each simulated session is its own user (own credentials, caches and
+conversation thread) and loops over a mix of chat turns, with an optional
+pause between turns. Turns go through graph.answer, the function run_agent
+calls once it has the session's credentials. Google APIs are FakeWorkspace
+and the model is ScriptedChatModel, both with sampled latencies.
+
+Per concurrency level: throughput, turn latency p50/p95/p99, errors, RSS
+growth per session, and peak threads, open file descriptors, cached API
+clients and transport connections.
+
+Latency specs: fixed:S | uniform:A:B | lognormal:MEDIAN:SIGMA (seconds).
+"""
+import argparse
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+
+import offline  # noqa: F401  (sets up paths and the cache dir first)
+from offline import fake_credentials, git_commit, latency_summary, setup
+
+TURN_MIX = [
+    "show my next 5 events",
+    "emails from alice",
+    "summarize the budget file",
+    "what does the report doc say about revenue forecast",
+    "give me my morning briefing",
+    "draft a follow-up to bob",
+]
+
+
+def parse_latency(spec):
+    """'fixed:0.05', 'uniform:0.02:0.2' or 'lognormal:0.08:0.5' -> callable returning seconds."""
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        mu = math.log(values[0]) if values[0] > 0 else 0.0
+        return lambda: random.lognormvariate(mu, values[1]) if values[0] > 0 else 0.0
+    raise SystemExit(f"unknown latency spec: {spec}")
+
+
+def rss_bytes():
+    """Current resident set size (Linux /proc; falls back to peak RSS elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def open_fds():
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+class Sampler(threading.Thread):
+    """Samples threads, RSS, fds and cached clients every `interval` seconds; keeps the peaks."""
+
+    def __init__(self, interval=0.1):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = {"threads": 0, "rss_bytes": 0, "open_fds": 0, "api_clients": 0}
+        self._stop_event = threading.Event()
+
+    def sample(self):
+        import google_clients
+        now = {
+            "threads": threading.active_count(),
+            "rss_bytes": rss_bytes(),
+            "open_fds": open_fds() or 0,
+            "api_clients": len(google_clients._POOL._entries),
+        }
+        for key, value in now.items():
+            self.peak[key] = max(self.peak[key], value)
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.sample()
+
+
+def session_loop(index, deadline, pause, samples, errors, lock):
+    import graph
+    creds = fake_credentials(f"load-{index}")
+    thread_id = uuid.uuid4().hex
+    rng = random.Random(index)
+    while time.monotonic() < deadline:
+        prompt = rng.choice(TURN_MIX)
+        t0 = time.perf_counter()
+        try:
+            graph.answer(prompt, creds, thread_id=thread_id)
+            ok = True
+        except Exception as e:
+            ok = False
+            with lock:
+                errors.append(f"{type(e).__name__}: {e}")
+        elapsed = time.perf_counter() - t0
+        if ok:
+            with lock:
+                samples.append(elapsed)
+        if pause:
+            time.sleep(pause())
+
+
+def run_level(sessions, duration, pause, workspace, llm):
+    samples, errors, lock = [], [], threading.Lock()
+    workspace.reset_stats()
+    llm_calls = llm.stats["calls"]
+    rss_before = rss_bytes()
+    sampler = Sampler()
+    sampler.start()
+
+    started = time.monotonic()
+    deadline = started + duration
+    workers = [
+        threading.Thread(target=session_loop, args=(i, deadline, pause, samples, errors, lock), daemon=True)
+        for i in range(sessions)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - started
+    sampler.stop()
+
+    stats = workspace.stats()
+    result = {
+        "sessions": sessions,
+        "turns": len(samples),
+        "errors": len(errors),
+        "throughput_tps": len(samples) / elapsed,
+        **(latency_summary(samples) if samples else {}),
+        "rss_growth_per_session_mb": (sampler.peak["rss_bytes"] - rss_before) / sessions / 2 ** 20,
+        "peak_rss_mb": sampler.peak["rss_bytes"] / 2 ** 20,
+        "peak_threads": sampler.peak["threads"],
+        "peak_open_fds": sampler.peak["open_fds"],
+        "api_clients": sampler.peak["api_clients"],
+        "transport_connections": stats["connections"],
+        "api_calls": stats["total_calls"],
+        "llm_calls": llm.stats["calls"] - llm_calls,
+    }
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session load test")
+    parser.add_argument("--levels", default="1,2,4,8,16,32", help="comma-separated session counts to ramp through")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    parser.add_argument("--api-latency", default="lognormal:0.06:0.5", help="per API request")
+    parser.add_argument("--llm-latency", default="lognormal:0.8:0.4", help="per LLM call")
+    parser.add_argument("--pause", default="fixed:0", help="user think time between turns")
+    parser.add_argument("--slo-p95", type=float, default=None, help="p95 turn latency budget in seconds")
+    parser.add_argument("--json", default=None, help="write results to this file")
+    args = parser.parse_args()
+
+    workspace, llm = setup(latency=parse_latency(args.api_latency), think_time=parse_latency(args.llm_latency))
+    pause = parse_latency(args.pause)
+    levels = [int(n) for n in args.levels.split(",")]
+
+    print(f"{'sessions':>8}{'turns/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+          f"{'MB/sess':>9}{'threads':>9}{'fds':>6}{'conns':>7}")
+    results = []
+    for sessions in levels:
+        r = run_level(sessions, args.duration, pause, workspace, llm)
+        results.append(r)
+        print(f"{sessions:>8}{r['throughput_tps']:>10.2f}{r.get('p50_ms', 0):>10.0f}{r.get('p95_ms', 0):>10.0f}"
+              f"{r.get('p99_ms', 0):>10.0f}{r['errors']:>8}{r['rss_growth_per_session_mb']:>9.2f}"
+              f"{r['peak_threads']:>9}{r['peak_open_fds']:>6}{r['transport_connections']:>7}")
+
+    # Saturation: first level where doubling sessions bought < 10% more throughput, or the SLO broke
+    knee = None
+    for prev, cur in zip(results, results[1:]):
+        if cur["throughput_tps"] < prev["throughput_tps"] * 1.1:
+            knee = prev["sessions"]
+            break
+    over_slo = next((r["sessions"] for r in results
+                     if args.slo_p95 is not None and r.get("p95_ms", 0) > args.slo_p95 * 1000), None)
+    if knee:
+        print(f"\nthroughput stops scaling after {knee} concurrent sessions")
+    if over_slo:
+        print(f"p95 exceeds {args.slo_p95}s at {over_slo} concurrent sessions")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "meta": {
+                    "commit": git_commit(),
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "duration": args.duration,
+                    "api_latency": args.api_latency,
+                    "llm_latency": args.llm_latency,
+                    "pause": args.pause,
+                },
+                "levels": results,
+                "saturation_sessions": knee,
+                "slo_breach_sessions": over_slo,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
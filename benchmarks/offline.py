@@ -0,0 +1,69 @@
+"""
+Shared setup for offline benchmarks: wires the app to FakeWorkspace and
+ScriptedChatModel, and provides fake credentials and latency statistics.
+
+Import this before any app module: it points ASSISTANT_CACHE_DIR at a
+throwaway directory so benchmark runs never touch the real caches.
+"""
+import datetime
+import math
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("ASSISTANT_CACHE_DIR", tempfile.mkdtemp(prefix="assistant-bench-"))
+
+from fake_llm import ScriptedChatModel  # noqa: E402
+from fake_workspace import FakeWorkspace  # noqa: E402
+
+
+def setup(latency=0.0, think_time=0.0, error_rate=0.0, **workspace_options):
+    """Route API traffic to a fresh FakeWorkspace and the agent to a ScriptedChatModel."""
+    import google_clients
+    import graph
+
+    workspace = FakeWorkspace(latency=latency, error_rate=error_rate, **workspace_options)
+    google_clients.set_transport_factory(workspace.http)
+    llm = ScriptedChatModel(think_time=think_time)
+    graph.set_llm_factory(lambda: llm)
+    return workspace, llm
+
+
+def fake_credentials(user="bench"):
+    """Credentials that never need a refresh; `user` sets the identity (credential_key)."""
+    from google.oauth2.credentials import Credentials
+    return Credentials(
+        token=f"token-{user}",
+        refresh_token=f"refresh-{user}",
+        client_id="bench-client",
+        client_secret="bench-secret",
+        token_uri="https://oauth2.googleapis.com/token",
+        expiry=datetime.datetime.utcnow() + datetime.timedelta(days=1),
+    )
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def latency_summary(seconds):
+    return {
+        "runs": len(seconds),
+        "p50_ms": percentile(seconds, 50) * 1000,
+        "p95_ms": percentile(seconds, 95) * 1000,
+        "p99_ms": percentile(seconds, 99) * 1000,
+        "mean_ms": sum(seconds) / len(seconds) * 1000,
+    }
+
+
+def git_commit():
+    import subprocess
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
@@ -0,0 +1,201 @@
+"""
+Offline benchmark suite: tools and full agent turns against a fake Google
+Workspace and a scripted chat model. No network, no API keys.
+
+    python benchmarks/offline_bench.py                              # default run, table output
+    python benchmarks/offline_bench.py --latency 0.05 --think 0.3   # model network RTT and LLM time
+    python benchmarks/offline_bench.py --json results.json          # save for later comparison
+    python benchmarks/offline_bench.py --compare results.json       # diff against a saved run
+
+Per tool: latency p50/p95/p99, API calls and bytes per call (after one warm-up
+call, with the Drive index crawled). Per turn: end-to-end latency through
+graph.answer, plus API calls, LLM calls and prompt size per turn. Also checks
+that a batched write answered 503 after it was applied is not sent again.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+import offline  # noqa: F401  (sets up paths and the cache dir first)
+from offline import fake_credentials, git_commit, latency_summary, setup
+
+# (tool, args); file ids refer to FakeWorkspace's seeded data
+TOOL_CASES = [
+    ("get_upcoming_events", {"n": 10}),
+    ("search_emails", {"query": "from:alice", "n": 10}),
+    ("read_latest_email", {}),
+    ("list_files", {"query": "budget"}),
+    ("find_file", {"name": "report"}),
+    ("read_file_content", {"file_id": "f00001"}),
+    ("search_file_content", {"file_id": "f00001", "question": "quarterly revenue forecast"}),
+]
+
+TURNS = [
+    "show my next 5 events",
+    "emails from alice",
+    "summarize the budget file",
+    "what does the report doc say about revenue forecast",
+    "give me my morning briefing",
+    "draft a follow-up to bob",
+    "send a note to 20 people",
+]
+
+
+def _wait_for_index(creds, timeout=30):
+    from drive_index import get_drive_index
+    from tools_google import drive_service, user_credentials
+    with user_credentials(creds):
+        index = get_drive_index(creds)
+        deadline = time.monotonic() + timeout
+        while not index.ensure_fresh(drive_service()) and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+
+def bench_tools(workspace, creds, runs):
+    import tools_google
+    results = {}
+    with tools_google.user_credentials(creds):
+        for name, args in TOOL_CASES:
+            tool = getattr(tools_google, name)
+            workspace.reset_stats()
+            t0 = time.perf_counter()
+            tool.invoke(args)
+            cold = time.perf_counter() - t0
+            cold_calls = workspace.stats()["total_calls"]
+
+            workspace.reset_stats()
+            samples = []
+            for _ in range(runs):
+                t0 = time.perf_counter()
+                tool.invoke(args)
+                samples.append(time.perf_counter() - t0)
+            stats = workspace.stats()
+            results[name] = {
+                **latency_summary(samples),
+                "cold_ms": cold * 1000,
+                "cold_api_calls": cold_calls,
+                "api_calls_per_call": stats["total_calls"] / runs,
+                "bytes_in_per_call": stats["bytes_in"] / runs,
+                "bytes_out_per_call": stats["bytes_out"] / runs,
+            }
+    return results
+
+
+def bench_turns(workspace, llm, creds, runs, fast_path):
+    import graph
+    from router import route
+    results = {}
+    for prompt in TURNS:
+        workspace.reset_stats()
+        llm_calls, prompt_chars = llm.stats["calls"], llm.stats["prompt_chars"]
+        samples = []
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            # A new thread per run: every turn starts a fresh conversation
+            graph.answer(prompt, creds, fast_path=fast_path)
+            samples.append(time.perf_counter() - t0)
+        stats = workspace.stats()
+        calls = llm.stats["calls"] - llm_calls
+        results[prompt] = {
+            **latency_summary(samples),
+            "routed": bool(fast_path and route(prompt)),
+            "api_calls_per_turn": stats["total_calls"] / runs,
+            "bytes_out_per_turn": stats["bytes_out"] / runs,
+            "llm_calls_per_turn": calls / runs,
+            "prompt_chars_per_llm_call": (llm.stats["prompt_chars"] - prompt_chars) / calls if calls else 0,
+        }
+    return results
+
+
+def check_applied_5xx(workspace, creds, recipients=5):
+    """
+    One drafts.create in a batch is applied but answered 503. Writes are only
+    re-sent on rate limits, so it must come back as failed, not as a duplicate.
+    """
+    import tools_google
+    before = len(workspace.drafts)
+    workspace.fail_after_apply("gmail_draft")
+    with tools_google.user_credentials(creds):
+        tools_google.bulk_create_email_drafts.invoke({
+            "recipients": [f"check{i}@example.com" for i in range(recipients)],
+            "subject": "Check",
+            "body": "Dear {recipient},\n\nA check.\n",
+        })
+    created = len(workspace.drafts) - before
+    return {"requested": recipients, "created": created, "duplicates": max(0, created - recipients)}
+
+
+def _print_table(title, rows, columns):
+    print(f"\n{title}")
+    widths = [max(10, len(c) + 2) for c in columns]
+    print(f"{'':<52}" + "".join(f"{c:>{w}}" for c, w in zip(columns, widths)))
+    for name, values in rows.items():
+        print(f"{name[:50]:<52}" + "".join(f"{values[c]:>{w}.1f}" for c, w in zip(columns, widths)))
+
+
+def _compare(report, baseline):
+    print(f"\nvs. baseline {baseline['meta'].get('commit')}:")
+    for section in ("tools", "turns"):
+        for name, values in report[section].items():
+            old = baseline.get(section, {}).get(name)
+            if not old:
+                continue
+            deltas = []
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                change = (values[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+                deltas.append(f"{key[:-3]} {change:+6.1f}%")
+            print(f"  {section[:-1]:<5} {name[:46]:<48}" + "  ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline tool and agent-turn benchmarks")
+    parser.add_argument("--runs", type=int, default=30, help="measured runs per tool / turn")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds per API request")
+    parser.add_argument("--think", type=float, default=0.0, help="simulated seconds per LLM call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of API requests failing with 503")
+    parser.add_argument("--no-router", action="store_true", help="send every turn through the agent")
+    parser.add_argument("--json", default=None, help="write results to this file")
+    parser.add_argument("--compare", default=None, help="baseline results file to diff against")
+    args = parser.parse_args()
+
+    workspace, llm = setup(latency=args.latency, think_time=args.think, error_rate=args.error_rate)
+    creds = fake_credentials()
+    _wait_for_index(creds)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "runs": args.runs,
+            "latency": args.latency,
+            "think": args.think,
+            "error_rate": args.error_rate,
+            "router": not args.no_router,
+        },
+        "tools": bench_tools(workspace, creds, args.runs),
+        "turns": bench_turns(workspace, llm, creds, args.runs, fast_path=not args.no_router),
+        "applied_5xx": check_applied_5xx(workspace, creds),
+    }
+
+    _print_table("tools", report["tools"], ("p50_ms", "p95_ms", "p99_ms", "api_calls_per_call"))
+    _print_table("turns", report["turns"], ("p50_ms", "p95_ms", "p99_ms", "api_calls_per_turn", "llm_calls_per_turn"))
+    check = report["applied_5xx"]
+    print(f"\nbatched write answered 503 after applying: {check['created']} drafts for "
+          f"{check['requested']} recipients, {check['duplicates']} duplicates")
+
+    if args.compare:
+        with open(args.compare) as f:
+            _compare(report, json.load(f))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if check["duplicates"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Fast-path router vs. full agent: latency for common commands.
+
+    python benchmarks/router_bench.py                          # classifier cost + route coverage only
+    python benchmarks/router_bench.py --token token.json       # end-to-end, both paths, live APIs
+    python benchmarks/router_bench.py --token token.json --runs 5 --json out.json
+
+--token is an authorized-user credentials file (the JSON auth.py keeps in
+session state). End-to-end runs need GOOGLE_API_KEY in .streamlit/secrets.toml.
+Tool results are memoized per session, so each prompt is timed cold (first run)
+and warm (the rest) separately.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from router import route  # noqa: E402
+
+PROMPTS = [
+    "show my next 5 events",
+    "what are my upcoming meetings?",
+    "events in 2026",
+    "list my drive files named budget",
+    "list my files",
+    "emails from alice@example.com",
+    "search my emails for invoice",
+    "read my latest email",
+    "find docs about budget",
+    "emails from john smith",
+    "show my next meeting",
+]
+
+# Routed prompts whose tool call is easy to get subtly wrong
+EXPECTED_CALLS = {
+    "show my next 5 events": ("get_upcoming_events", {"n": 5}),
+    "show my next meeting": ("get_upcoming_events", {"n": 1}),
+    "find docs about budget": ("list_files", {"query": "budget"}),
+    "emails from john smith": ("search_emails", {"query": 'from:"john smith"', "n": 10}),
+}
+
+# Should never be routed: they need the model
+AGENT_ONLY = [
+    "email the budget file to John",
+    "summarize my latest email and draft a reply",
+    "delete my meeting tomorrow",
+    "what does the Q3 report say about hiring?",
+    "find files named budget and email it to john",
+    "search my emails for invoice and draft a reply to John",
+    "emails from john and summarize them",
+    "list my files named report and delete them",
+    "docs",
+    "calendar",
+    "show me 99 events",
+    "find docs from last week",
+    "find files shared with bob",
+]
+
+
+def time_classifier(rounds):
+    prompts = PROMPTS + AGENT_ONLY
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for prompt in prompts:
+            route(prompt)
+    return (time.perf_counter() - t0) / (rounds * len(prompts)) * 1e6
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "p50_ms": statistics.median(samples) * 1000,
+        "max_ms": samples[-1] * 1000,
+        "runs": len(samples),
+    }
+
+
+def time_end_to_end(token_file, runs):
+    from google.oauth2.credentials import Credentials
+    import graph
+
+    creds = Credentials.from_authorized_user_file(token_file)
+    results = {}
+    for prompt in PROMPTS:
+        results[prompt] = {}
+        for label, fast_path in (("agent", False), ("router", True)):
+            cold, warm = None, []
+            for i in range(runs):
+                t0 = time.perf_counter()
+                graph.answer(prompt, creds, fast_path=fast_path)
+                elapsed = time.perf_counter() - t0
+                if i == 0:
+                    cold = elapsed
+                else:
+                    warm.append(elapsed)
+            results[prompt][label] = {"cold_ms": cold * 1000, **(summarize(warm) if warm else {})}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Router vs. agent latency")
+    parser.add_argument("--token", default=None, help="authorized-user credentials JSON for end-to-end runs")
+    parser.add_argument("--runs", type=int, default=3, help="runs per prompt and path (end-to-end)")
+    parser.add_argument("--rounds", type=int, default=2000, help="classifier rounds")
+    parser.add_argument("--json", default=None, help="write results to this file")
+    args = parser.parse_args()
+
+    report = {"classifier_us": time_classifier(args.rounds)}
+    missed = [p for p in PROMPTS if route(p) is None]
+    wrong = [p for p in AGENT_ONLY if route(p) is not None]
+    bad_calls = {}
+    for prompt, expected in EXPECTED_CALLS.items():
+        fast = route(prompt)
+        call = (fast.tool, fast.args) if fast else None
+        if call != expected:
+            bad_calls[prompt] = call
+    report["coverage"] = {"routed": len(PROMPTS) - len(missed), "of": len(PROMPTS), "false_routes": wrong,
+                          "wrong_calls": {p: str(call) for p, call in bad_calls.items()}}
+
+    print(f"classifier: {report['classifier_us']:.1f} us/prompt")
+    print(f"routed {len(PROMPTS) - len(missed)}/{len(PROMPTS)} simple prompts; "
+          f"{len(wrong)} of {len(AGENT_ONLY)} agent-only prompts wrongly routed")
+    for prompt in missed:
+        print(f"  not routed: {prompt!r}")
+    for prompt in wrong:
+        print(f"  wrongly routed: {prompt!r}")
+    for prompt, call in bad_calls.items():
+        print(f"  wrong call for {prompt!r}: {call}, expected {EXPECTED_CALLS[prompt]}")
+
+    if args.token:
+        report["end_to_end"] = time_end_to_end(args.token, args.runs)
+        print(f"\n{'prompt':<40}{'agent cold':>12}{'router cold':>13}{'agent p50':>11}{'router p50':>12}")
+        agent_medians, router_medians = [], []
+        for prompt, paths in report["end_to_end"].items():
+            agent, fast = paths["agent"], paths["router"]
+            agent_medians.append(agent.get("p50_ms", agent["cold_ms"]))
+            router_medians.append(fast.get("p50_ms", fast["cold_ms"]))
+            print(f"{prompt[:38]:<40}{agent['cold_ms']:>12.0f}{fast['cold_ms']:>13.0f}"
+                  f"{agent_medians[-1]:>11.0f}{router_medians[-1]:>12.0f}")
+        report["median_ms"] = {
+            "agent": statistics.median(agent_medians),
+            "router": statistics.median(router_medians),
+        }
+        print(f"\nmedian over prompts: agent {report['median_ms']['agent']:.0f} ms, "
+              f"router {report['median_ms']['router']:.0f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if wrong or bad_calls:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# calendar_cache.py
+import bisect
+import datetime
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+from google_clients import credential_key, execute
+
+# --- Cache Settings ---
+SYNC_INTERVAL = 30        # seconds between incremental syncs
+PAGE_SIZE = 2500          # Calendar's maximum page size
+# Only this window is synced, so recurring events are expanded over months,
+# not the calendar's whole history. Queries reaching outside it go live.
+WINDOW_PAST_DAYS = 30
+WINDOW_FUTURE_DAYS = 365
+RESYNC_INTERVAL = 24 * 60 * 60   # seconds before the window is re-anchored by a full sync
+
+
+def _rfc3339(epoch):
+    return datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _timestamp(edge):
+    """Start/end of an event as a UTC epoch (all-day events start at UTC midnight)."""
+    if 'dateTime' in edge:
+        value = datetime.datetime.fromisoformat(edge['dateTime'].replace('Z', '+00:00'))
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+    else:
+        value = datetime.datetime.fromisoformat(edge['date']).replace(tzinfo=datetime.timezone.utc)
+    return value.timestamp()
+
+
+class CalendarCache:
+    """
+    One user's primary calendar over a bounded window, kept in memory and
+    synced with syncToken. Events sit in a list sorted by start time; together
+    with the longest event duration this answers overlap queries with one
+    bisect plus a forward scan.
+    """
+
+    def __init__(self):
+        self._events = {}          # id -> (start, end, event)
+        self._starts = []          # sorted (start, id)
+        self._max_duration = 0.0
+        self._window = (0.0, 0.0)  # [start, end) epoch seconds covered by the sync
+        self._sync_token = None
+        self._last_sync = 0.0
+        self._last_full_sync = 0.0
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+
+    # --- sync ---
+    def ensure_fresh(self, service):
+        """
+        Sync if due. The API calls run outside the data lock, so queries keep
+        being answered from the last state while another thread syncs.
+        Returns False while there is no synced state yet.
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            return self._sync_token is not None
+        try:
+            now = time.monotonic()
+            if self._sync_token is None or now - self._last_full_sync >= RESYNC_INTERVAL:
+                self._full_sync(service)
+            elif now - self._last_sync >= SYNC_INTERVAL:
+                try:
+                    items, token = self._list(service, sync_token=self._sync_token)
+                except HttpError as e:
+                    if e.resp.status != 410:
+                        raise
+                    # Sync token invalidated by the server -> start over
+                    self._full_sync(service)
+                else:
+                    with self._lock:
+                        self._apply(items)
+                        self._sync_token = token
+                        self._last_sync = time.monotonic()
+            return True
+        finally:
+            self._sync_lock.release()
+
+    def _list(self, service, sync_token=None, window=None):
+        """All pages of a full (windowed) or incremental listing -> (items, nextSyncToken)."""
+        # The Calendar API rejects timeMin/timeMax alongside a syncToken; incremental
+        # results can therefore include events outside the window (_apply drops them)
+        bounds = {}
+        if window is not None:
+            bounds = {"timeMin": _rfc3339(window[0]), "timeMax": _rfc3339(window[1])}
+        items, page_token = [], None
+        while True:
+            result = execute(service.events().list(
+                calendarId='primary',
+                singleEvents=True,
+                maxResults=PAGE_SIZE,
+                pageToken=page_token,
+                syncToken=sync_token,
+                **bounds
+            ))
+            items.extend(result.get('items', []))
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                return items, result.get('nextSyncToken')
+
+    def _full_sync(self, service):
+        now = time.time()
+        window = (now - WINDOW_PAST_DAYS * 86400, now + WINDOW_FUTURE_DAYS * 86400)
+        items, token = self._list(service, window=window)
+        with self._lock:
+            self._window = window
+            self._events = {}
+            for event in items:
+                self._store(event)
+            self._starts = sorted((start, event_id) for event_id, (start, _, _) in self._events.items())
+            self._max_duration = max((end - start for start, end, _ in self._events.values()), default=0.0)
+            self._sync_token = token
+            self._last_sync = self._last_full_sync = time.monotonic()
+
+    def _apply(self, items):
+        for event in items:
+            self.remove(event['id'])
+            if event.get('status') != 'cancelled':
+                self.put(event)
+
+    def _store(self, event):
+        if event.get('status') == 'cancelled' or 'start' not in event:
+            return None
+        start, end = _timestamp(event['start']), _timestamp(event['end'])
+        if end <= self._window[0] or start >= self._window[1]:
+            return None
+        self._events[event['id']] = (start, end, event)
+        self._max_duration = max(self._max_duration, end - start)
+        return start
+
+    # --- write-through ---
+    def put(self, event):
+        with self._lock:
+            self.remove(event['id'])
+            start = self._store(event)
+            if start is not None:
+                bisect.insort(self._starts, (start, event['id']))
+
+    def remove(self, event_id):
+        with self._lock:
+            found = self._events.pop(event_id, None)
+            if found:
+                i = bisect.bisect_left(self._starts, (found[0], event_id))
+                if i < len(self._starts) and self._starts[i][1] == event_id:
+                    del self._starts[i]
+                # Keep the overlap scan as narrow as the events actually cached
+                if found[1] - found[0] >= self._max_duration:
+                    self._max_duration = max((end - start for start, end, _ in self._events.values()), default=0.0)
+
+    # --- queries ---
+    def between(self, time_min, time_max=None, n=10):
+        """
+        Up to n events overlapping [time_min, time_max), ordered by start.
+        Same semantics as events().list(timeMin, timeMax, orderBy='startTime').
+        Returns None when the answer depends on events outside the synced window.
+        """
+        with self._lock:
+            window_start, window_end = self._window
+            if time_min < window_start:
+                return None
+            # Nothing starting before time_min - max_duration can still be running
+            i = bisect.bisect_left(self._starts, (time_min - self._max_duration,))
+            found = []
+            while i < len(self._starts) and len(found) < n:
+                start, event_id = self._starts[i]
+                if time_max is not None and start >= time_max:
+                    break
+                _, end, event = self._events[event_id]
+                if end > time_min:
+                    found.append(event)
+                i += 1
+            # Ran out of cached events before n: more may start past the window
+            if len(found) < n and (time_max is None or time_max > window_end):
+                return None
+            return found
+
+
+# --- Per-user registry ---
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_calendar_cache(creds):
+    key = credential_key(creds)
+    with _CACHES_LOCK:
+        if key not in _CACHES:
+            _CACHES[key] = CalendarCache()
+        return _CACHES[key]
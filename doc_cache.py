@@ -0,0 +1,167 @@
+# doc_cache.py
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from tracing import register_collector
+from utils import CACHE_DIR
+
+# --- Cache Settings ---
+MEMORY_BUDGET = 64 * 1024 * 1024     # bytes of extracted text kept in process
+DISK_BUDGET = 1024 * 1024 * 1024     # bytes kept under CACHE_DIR/docs
+
+
+def revision_key(file_meta):
+    """
+    Content address for a Drive file: id plus the strongest revision marker it has.
+    Binary files carry md5Checksum/headRevisionId; Google Docs only modifiedTime.
+    The metadata call that yields these runs with the caller's credentials,
+    so a cache hit never bypasses Drive's access checks.
+    """
+    revision = (
+        file_meta.get('md5Checksum')
+        or file_meta.get('headRevisionId')
+        or file_meta.get('modifiedTime')
+    )
+    if not revision:
+        return None
+    return f"{file_meta['id']}:{revision}"
+
+
+class DocumentCache:
+    """
+    Extracted document text: an in-process LRU bounded by bytes over an on-disk
+    store. Entries are scoped by user (credential_key); each user's files live
+    in their own owner-only directory.
+    """
+
+    def __init__(self, root=None, memory_budget=MEMORY_BUDGET, disk_budget=DISK_BUDGET):
+        self.root = root or os.path.join(CACHE_DIR, "docs")
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self._memory = OrderedDict()   # (user, key) -> text
+        self._memory_bytes = 0
+        self._disk_bytes = None        # running total, counted once on first write
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def _path(self, user, key):
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, user, digest[:2], f"{digest}.txt")
+
+    def get(self, user, key):
+        with self._lock:
+            if (user, key) in self._memory:
+                self._memory.move_to_end((user, key))
+                self._stats["memory_hits"] += 1
+                return self._memory[(user, key)]
+
+        path = self._path(user, key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+
+        os.utime(path)  # keeps disk pruning LRU-ish
+        with self._lock:
+            self._stats["disk_hits"] += 1
+            self._remember((user, key), text)
+        return text
+
+    def put(self, user, key, text):
+        path = self._path(user, key)
+        # Document text is private: directories 0700, files 0600
+        # (makedirs only applies the mode to the leaf, so create each level)
+        os.makedirs(os.path.join(self.root, user), mode=0o700, exist_ok=True)
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        data = text.encode("utf-8")
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._remember((user, key), text)
+            if self._disk_bytes is None:
+                self._disk_bytes = self._disk_usage()
+            else:
+                self._disk_bytes += len(data) - replaced
+            over = self._disk_bytes > self.disk_budget
+        if over:
+            self._prune_disk()
+
+    def _remember(self, key, text):
+        size = len(text.encode("utf-8"))
+        if size > self.memory_budget:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key).encode("utf-8"))
+        self._memory[key] = text
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_budget:
+            _, old = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old.encode("utf-8"))
+            self._stats["evictions"] += 1
+
+    def _entries(self):
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(folder, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+    def _disk_usage(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _prune_disk(self):
+        """Only runs once the running total passes the budget; trims to 90% so it stays rare."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_budget * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_bytes
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+_CACHE = DocumentCache()
+
+
+def get_document_cache():
+    return _CACHE
+
+
+def document_cache_stats():
+    """Hit/miss counters for the parsed-document cache."""
+    return _CACHE.stats()
+
+
+register_collector("document_cache", document_cache_stats,
+                   counters=("memory_hits", "disk_hits", "misses", "evictions"))
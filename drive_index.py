@@ -0,0 +1,225 @@
+# drive_index.py
+import hashlib
+import sqlite3
+import threading
+import time
+
+from google_clients import build_service, credential_key, execute, get_service
+from utils import cache_path
+
+# --- Index Settings ---
+SYNC_INTERVAL = 60        # seconds between changes-feed polls
+CRAWL_PAGE_SIZE = 1000    # Drive's maximum page size
+
+FOLDER_MIME = 'application/vnd.google-apps.folder'
+
+FILE_FIELDS = "id, name, mimeType, shortcutDetails, parents, modifiedTime, ownedByMe, trashed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_lower TEXT NOT NULL,
+    mime_type TEXT,
+    target_id TEXT,
+    target_mime TEXT,
+    parents TEXT,
+    modified_time TEXT,
+    owned_by_me INTEGER,
+    is_folder INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_name ON files (name_lower);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def _row(item):
+    mime = item.get('mimeType', '')
+    shortcut = item.get('shortcutDetails', {})
+    target_mime = shortcut.get('targetMimeType', '')
+    name = item.get('name', '')
+    return (
+        item['id'],
+        name,
+        name.lower(),
+        mime,
+        shortcut.get('targetId'),
+        target_mime,
+        ",".join(item.get('parents', [])),
+        item.get('modifiedTime'),
+        1 if item.get('ownedByMe') else 0,
+        1 if mime == FOLDER_MIME or 'folder' in target_mime else 0,
+    )
+
+
+def _escape_like(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class DriveIndex:
+    """
+    Local SQLite copy of one user's Drive metadata.
+    Filled by one full paginated crawl (in the background), then kept current
+    through the changes feed. Searches never leave the machine.
+    """
+
+    def __init__(self, path, creds):
+        self.creds = creds
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._crawl_thread = None
+        self._last_sync = 0.0
+        self.errors = 0           # failed lookups that fell back to a live query
+
+    # --- meta helpers ---
+    def _get_meta(self, key):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @property
+    def ready(self):
+        with self._lock:
+            return self._get_meta("page_token") is not None
+
+    # --- sync ---
+    def ensure_fresh(self, service):
+        """Start the initial crawl if needed, otherwise poll the changes feed (throttled)."""
+        if not self.ready:
+            self._start_crawl()
+            return False
+        if time.monotonic() - self._last_sync >= SYNC_INTERVAL:
+            self.apply_changes(service)
+        return True
+
+    def _start_crawl(self):
+        with self._lock:
+            if self._crawl_thread is not None and self._crawl_thread.is_alive():
+                return
+            self._crawl_thread = threading.Thread(target=self._crawl, daemon=True)
+            self._crawl_thread.start()
+
+    def _crawl(self):
+        # The crawl gets its own client so it does not hold the tools' connection slots.
+        service = build_service("drive", "v3", self.creds)
+        # Take the start token *before* listing so changes made mid-crawl get replayed.
+        start_token = execute(service.changes().getStartPageToken())['startPageToken']
+
+        rows = []
+        page_token = None
+        while True:
+            result = execute(service.files().list(
+                pageSize=CRAWL_PAGE_SIZE,
+                pageToken=page_token,
+                q="trashed = false",
+                spaces="drive",
+                fields=f"nextPageToken, files({FILE_FIELDS})"
+            ))
+            rows.extend(_row(item) for item in result.get('files', []))
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                break
+
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM files")
+            self._db.executemany("INSERT OR REPLACE INTO files VALUES (?,?,?,?,?,?,?,?,?,?)", rows)
+            self._set_meta("page_token", start_token)
+        self._last_sync = time.monotonic()
+
+    def apply_changes(self, service):
+        with self._lock:
+            page_token = self._get_meta("page_token")
+
+        upserts, removed = [], []
+        while page_token:
+            result = execute(service.changes().list(
+                pageToken=page_token,
+                pageSize=CRAWL_PAGE_SIZE,
+                spaces="drive",
+                includeRemoved=True,
+                fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}))"
+            ))
+            for change in result.get('changes', []):
+                item = change.get('file')
+                if change.get('removed') or item is None or item.get('trashed'):
+                    removed.append((change['fileId'],))
+                else:
+                    upserts.append(_row(item))
+            if 'newStartPageToken' in result:
+                page_token = result['newStartPageToken']
+                break
+            page_token = result.get('nextPageToken')
+
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO files VALUES (?,?,?,?,?,?,?,?,?,?)", upserts)
+            self._db.executemany("DELETE FROM files WHERE id = ?", removed)
+            self._set_meta("page_token", page_token)
+        self._last_sync = time.monotonic()
+
+    def upsert(self, item):
+        """Write-through for files we create ourselves."""
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO files VALUES (?,?,?,?,?,?,?,?,?,?)", _row(item))
+
+    # --- queries ---
+    def search(self, text=None, n=30, prefix=False, owned_only=True):
+        """Name search (substring, or prefix) ordered like Drive's 'folder,name'."""
+        sql = "SELECT id, name, mime_type, target_mime FROM files WHERE 1 = 1"
+        params = []
+        if owned_only:
+            sql += " AND owned_by_me = 1"
+        if text and prefix:
+            # Range scan on the name index
+            sql += " AND name_lower >= ? AND name_lower < ?"
+            params.extend([text.lower(), text.lower() + "\uffff"])
+        elif text:
+            sql += " AND name_lower LIKE ? ESCAPE '\\'"
+            params.append(f"%{_escape_like(text.lower())}%")
+        sql += " ORDER BY is_folder DESC, name_lower LIMIT ?"
+        params.append(n)
+
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        # Same shape as a files().list item so callers can treat both alike
+        return [
+            {"id": r[0], "name": r[1], "mimeType": r[2], "shortcutDetails": {"targetMimeType": r[3] or ""}}
+            for r in rows
+        ]
+
+
+# --- Per-user registry ---
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+_ACCOUNTS = {}            # credential_key -> account key
+
+
+def account_key(creds):
+    """
+    Key for the user's Drive account rather than their token: the permissionId
+    stays the same when the refresh token is rotated or the user logs in again,
+    so the index on disk is not orphaned and re-crawled.
+    """
+    key = credential_key(creds)
+    with _INDEXES_LOCK:
+        account = _ACCOUNTS.get(key)
+    if account is None:
+        about = execute(get_service("drive", "v3", creds).about().get(fields="user(permissionId)"))
+        account = hashlib.sha256(about["user"]["permissionId"].encode("utf-8")).hexdigest()[:32]
+        with _INDEXES_LOCK:
+            _ACCOUNTS[key] = account
+    return account
+
+
+def get_drive_index(creds):
+    key = account_key(creds)
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        if index is None:
+            index = DriveIndex(cache_path("drive", f"{key}.sqlite"), creds)
+            _INDEXES[key] = index
+        # Crawls and syncs use the newest credentials for the account
+        index.creds = creds
+        return index
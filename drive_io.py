@@ -0,0 +1,182 @@
+# drive_io.py
+import base64
+import codecs
+import os
+import tempfile
+
+from google_clients import MAX_RETRIES, execute, execute_resumable
+from tracing import span
+
+# --- Download Settings ---
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024     # bytes per ranged request
+MAX_DOWNLOAD_BYTES = 100 * 1024 * 1024    # hard ceiling per file
+SPOOL_THRESHOLD = 8 * 1024 * 1024         # larger downloads roll over to a temp file
+TEXT_CHAR_BUDGET = 200_000                # characters kept from text files
+
+# --- Upload Settings ---
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024       # bytes per resumable PUT; must be a multiple of 256 KB
+RESUMABLE_THRESHOLD = 5 * 1024 * 1024     # smaller uploads go in one multipart request
+SESSION_RESTARTS = 1                      # fresh sessions tried when one expires mid-upload
+SPOOL_PIECE = 1024 * 1024                 # characters encoded/decoded per step when spooling
+
+
+class DownloadTooLarge(Exception):
+    pass
+
+
+def check_size(file_meta, max_bytes=MAX_DOWNLOAD_BYTES):
+    """Refuse before downloading when Drive already reports the file as too big."""
+    size = int(file_meta.get('size') or 0)
+    if size > max_bytes:
+        raise DownloadTooLarge(
+            f"File is too large to read ({size // (1024 * 1024)} MB; limit {max_bytes // (1024 * 1024)} MB)."
+        )
+
+
+def _download(request, sink, max_bytes, chunk_size, stop=None):
+    """
+    Pull `request` through MediaIoBaseDownload chunk by chunk into `sink`.
+    Returns True if the whole file was fetched, False if `stop()` ended it early.
+    """
+    from googleapiclient.http import MediaIoBaseDownload
+    downloader = MediaIoBaseDownload(sink, request, chunksize=chunk_size)
+    done = False
+    with span("api", getattr(request, "methodId", None) or "media.download") as trace:
+        while not done:
+            status, done = downloader.next_chunk(num_retries=MAX_RETRIES)
+            trace.add("chunks")
+            if status.resumable_progress > max_bytes:
+                raise DownloadTooLarge(f"Download exceeded {max_bytes // (1024 * 1024)} MB.")
+            if not done and stop is not None and stop():
+                return False
+    return True
+
+
+def download_spooled(request, max_bytes=MAX_DOWNLOAD_BYTES, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Download into memory up to SPOOL_THRESHOLD, spilling to a temp file beyond that."""
+    fh = tempfile.SpooledTemporaryFile(max_size=SPOOL_THRESHOLD)
+    try:
+        _download(request, fh, max_bytes, chunk_size)
+    except Exception:
+        fh.close()
+        raise
+    fh.seek(0)
+    return fh
+
+
+def download_to_path(request, suffix="", max_bytes=MAX_DOWNLOAD_BYTES, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Download to a named temp file (for consumers that open by path). Caller removes it."""
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            _download(request, fh, max_bytes, chunk_size)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+class _TextSink:
+    """File-like sink that decodes UTF-8 as bytes arrive and keeps at most `budget` characters."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.parts = []
+        self.chars = 0
+        self.truncated = False
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def write(self, data):
+        if self.full:
+            self.truncated = True
+            return len(data)
+        text = self._decoder.decode(data)
+        room = self.budget - self.chars
+        if len(text) > room:
+            text = text[:room]
+            self.truncated = True
+        self.parts.append(text)
+        self.chars += len(text)
+        return len(data)
+
+    @property
+    def full(self):
+        return self.chars >= self.budget
+
+    def text(self):
+        if not self.full:
+            self.parts.append(self._decoder.decode(b"", final=True))
+        return "".join(self.parts)
+
+
+def download_text(request, char_budget=TEXT_CHAR_BUDGET, max_bytes=MAX_DOWNLOAD_BYTES,
+                  chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """
+    Stream-decode a text download. Stops fetching once char_budget is reached.
+    Returns (text, truncated).
+    """
+    sink = _TextSink(char_budget)
+    complete = _download(request, sink, max_bytes, chunk_size, stop=lambda: sink.full)
+    return sink.text(), sink.truncated or not complete
+
+
+# --- Uploads ---
+def spool_text(text, encoding="utf-8"):
+    """Encode text into a spooled temp file a piece at a time (no second full-size copy)."""
+    fh = tempfile.SpooledTemporaryFile(max_size=SPOOL_THRESHOLD)
+    for i in range(0, len(text), SPOOL_PIECE):
+        fh.write(text[i:i + SPOOL_PIECE].encode(encoding))
+    fh.seek(0)
+    return fh
+
+
+def spool_base64(data):
+    """Decode base64 into a spooled temp file a piece at a time. Whitespace is ignored."""
+    fh = tempfile.SpooledTemporaryFile(max_size=SPOOL_THRESHOLD)
+    carry = ""
+    try:
+        for i in range(0, len(data), SPOOL_PIECE):
+            piece = carry + "".join(data[i:i + SPOOL_PIECE].split())
+            # Only whole 4-character groups decode on their own
+            cut = len(piece) - len(piece) % 4
+            fh.write(base64.b64decode(piece[:cut], validate=True))
+            carry = piece[cut:]
+        if carry:
+            raise ValueError("Incorrect base64 padding.")
+    except Exception:
+        fh.close()
+        raise
+    fh.seek(0)
+    return fh
+
+
+def upload_stream(service, metadata, stream, mime_type, fields="id",
+                  chunk_size=UPLOAD_CHUNK_SIZE, progress=None):
+    """
+    Create a Drive file from a seekable binary stream without reading it into memory.
+    Uploads over RESUMABLE_THRESHOLD use a resumable session in chunk_size pieces;
+    progress(bytes_sent, total) is called as they go. Returns the file's metadata.
+    """
+    from googleapiclient.http import MediaIoBaseUpload
+    if chunk_size % (256 * 1024):
+        raise ValueError("chunk_size must be a multiple of 256 KB.")
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    resumable = size > RESUMABLE_THRESHOLD
+
+    for attempt in range(SESSION_RESTARTS + 1):
+        stream.seek(0)
+        media = MediaIoBaseUpload(stream, mimetype=mime_type, chunksize=chunk_size, resumable=resumable)
+        request = service.files().create(body=metadata, media_body=media, fields=fields)
+        if not resumable:
+            file = execute(request)
+            if progress is not None:
+                progress(size, size)
+            return file
+        try:
+            return execute_resumable(request, progress)
+        except Exception as e:
+            # An expired or unknown session (404/410) can only be restarted from byte 0
+            status = getattr(getattr(e, "resp", None), "status", None)
+            if status not in (404, 410) or attempt == SESSION_RESTARTS:
+                raise
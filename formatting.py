@@ -0,0 +1,95 @@
+# formatting.py
+# Compact, budgeted tool output. Everything a tool returns is fed back to the
+# model on each ReAct step, so lists are encoded as small pipe tables and every
+# output has a hard size cap with an explicit marker saying how to get the rest.
+
+# --- Output Budgets (characters; roughly 4 per token) ---
+TOOL_BUDGETS = {
+    "get_upcoming_events": 3000,
+    "search_emails": 4000,
+    "list_files": 3000,
+    "read_file_content": 12000,
+    "search_file_content": 6000,
+    "bulk_delete_events": 8000,
+    "bulk_create_email_drafts": 8000,
+    "bulk_drive_upload": 8000,
+}
+DEFAULT_BUDGET = 4000
+CELL_CHARS = 200          # longest single cell (snippets, titles)
+SEPARATOR = "|"
+
+
+def budget_for(tool_name):
+    return TOOL_BUDGETS.get(tool_name, DEFAULT_BUDGET)
+
+
+def _cell(value):
+    text = " ".join(str(value if value is not None else "").split())
+    # The separator never appears inside a cell
+    text = text.replace(SEPARATOR, "¦")
+    if len(text) > CELL_CHARS:
+        text = text[:CELL_CHARS - 1] + "…"
+    return text
+
+
+def more_marker(offset):
+    return f"[More: call again with offset={offset}]"
+
+
+def table(title, columns, rows, budget=DEFAULT_BUDGET, offset=0, has_more=False, pageable=True):
+    """
+    Encode rows as:
+        <title> <first>-<last>
+        col1|col2|...
+        v1|v2|...
+        [More: call again with offset=N]     (only when there is more)
+    Rows that would push the output past `budget` characters are left out
+    and picked up by the offset in the marker (pageable=False: just counted).
+    """
+    header = SEPARATOR.join(columns)
+    lines = []
+    size = len(title) + len(header) + 64   # headroom for the range and marker lines
+    for row in rows:
+        line = SEPARATOR.join(_cell(value) for value in row)
+        if lines and size + len(line) + 1 > budget:
+            break
+        lines.append(line)
+        size += len(line) + 1
+
+    shown = len(lines)
+    out = [f"{title} {offset + 1}-{offset + shown}", header] + lines
+    if not pageable and shown < len(rows):
+        out.append(f"[{len(rows) - shown} more rows not shown]")
+    elif shown < len(rows) or has_more:
+        out.append(more_marker(offset + shown))
+    return "\n".join(out)
+
+
+def parse_table(output):
+    """Rows of a table() output as dicts, or None if `output` isn't one."""
+    lines = output.splitlines()
+    if len(lines) < 2 or SEPARATOR not in lines[1]:
+        return None
+    columns = lines[1].split(SEPARATOR)
+    rows = []
+    for line in lines[2:]:
+        if line.startswith("[More:"):
+            break
+        rows.append(dict(zip(columns, line.split(SEPARATOR))))
+    return rows
+
+
+def clip(text, budget=DEFAULT_BUDGET, offset=0, hint="call again with offset={offset} for more"):
+    """
+    A budget-sized window of long text, with a marker saying where to continue.
+    `hint` is how to get the rest ({offset} is filled in); pass one that names a
+    valid call when the tool producing `text` has no offset parameter.
+    """
+    window = text[offset:offset + budget]
+    end = offset + len(window)
+    if offset == 0 and end >= len(text):
+        return window
+    marker = f"[Truncated: characters {offset}-{end} of {len(text)} shown"
+    if end < len(text) and hint:
+        marker += "; " + hint.format(offset=end)
+    return f"{window}\n{marker}]"
@@ -0,0 +1,396 @@
+# gmail_mirror.py
+import base64
+import datetime
+import hashlib
+import logging
+import os
+import re
+import shlex
+import sqlite3
+import threading
+import time
+
+from google_clients import batch_execute, build_service, credential_key, execute, get_service
+from utils import CACHE_DIR, private_cache_path
+
+logger = logging.getLogger(__name__)
+
+# --- Mirror Settings ---
+MIRROR_ENABLED = os.environ.get("GMAIL_MIRROR", "0") == "1"
+# Mirror files nobody has used for this long (e.g. of a revoked login) are deleted
+MIRROR_TTL_DAYS = float(os.environ.get("GMAIL_MIRROR_TTL_DAYS", "30"))
+BACKFILL_LIMIT = 2000      # newest messages copied on first sync
+SYNC_INTERVAL = 30         # seconds between history polls
+MAX_STALENESS = 10 * 60    # older than this (and unable to sync) -> use the API
+MAX_BODY_CHARS = 20000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT,
+    internal_date INTEGER,
+    sender TEXT,
+    recipients TEXT,
+    subject TEXT,
+    snippet TEXT,
+    labels TEXT,
+    body TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_date ON messages (internal_date);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (sender, recipients, subject, body);
+CREATE TABLE IF NOT EXISTS labels (id TEXT PRIMARY KEY, name TEXT);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# ==========================
+# Message decoding
+# ==========================
+
+def _decode(data):
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4)).decode("utf-8", errors="replace")
+
+
+def _plain_text(payload):
+    """First text/plain part of a message (falls back to tag-stripped HTML)."""
+    html = None
+    stack = [payload]
+    while stack:
+        part = stack.pop(0)
+        mime = part.get("mimeType", "")
+        data = part.get("body", {}).get("data")
+        if data and mime == "text/plain":
+            return _decode(data)
+        if data and mime == "text/html" and html is None:
+            html = re.sub(r"<[^>]+>", " ", _decode(data))
+        stack.extend(part.get("parts", []))
+    return html or ""
+
+
+def _row(msg):
+    headers = {h["name"].lower(): h["value"] for h in msg.get("payload", {}).get("headers", [])}
+    recipients = ", ".join(filter(None, [headers.get("to"), headers.get("cc")]))
+    return (
+        msg["id"],
+        msg.get("threadId"),
+        int(msg.get("internalDate", 0)),
+        headers.get("from", ""),
+        recipients,
+        headers.get("subject", ""),
+        msg.get("snippet", ""),
+        " " + " ".join(msg.get("labelIds", [])) + " ",
+        _plain_text(msg.get("payload", {}))[:MAX_BODY_CHARS],
+    )
+
+# ==========================
+# Query translation
+# ==========================
+
+_RELATIVE_UNITS = {"d": 1, "m": 30, "y": 365}
+_FLAG_LABELS = {"unread": "UNREAD", "starred": "STARRED", "important": "IMPORTANT"}
+
+
+def _parse_date(value):
+    return datetime.datetime.strptime(value.replace("-", "/"), "%Y/%m/%d")
+
+
+def _epoch_ms(dt):
+    return int(dt.replace(tzinfo=datetime.timezone.utc).timestamp() * 1000)
+
+
+def _fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def translate_query(query, label_ids):
+    """
+    Translate a Gmail search string into (sql_where, params).
+    Returns None when the query uses operators the mirror cannot answer
+    (OR, negation, has:, grouping ...) so the caller can fall back to the API.
+    """
+    try:
+        tokens = shlex.split(query or "")
+    except ValueError:
+        return None
+
+    where, params, words = [], [], []
+    mailbox_scoped = False
+
+    for token in tokens:
+        if token.upper() in ("OR", "AND") or token.startswith(("-", "(", "{")):
+            return None
+        key, sep, value = token.partition(":")
+        key = key.lower()
+        if not sep:
+            words.append(_fts_phrase(token))
+        elif key in ("from", "to", "subject"):
+            column = {"from": "sender", "to": "recipients", "subject": "subject"}[key]
+            where.append(f"lower({column}) LIKE ?")
+            params.append(f"%{value.lower()}%")
+        elif key in ("label", "in"):
+            label = label_ids.get(value.lower(), value.upper())
+            where.append("labels LIKE ?")
+            params.append(f"% {label} %")
+            mailbox_scoped = True
+        elif key == "is" and value.lower() in _FLAG_LABELS:
+            where.append("labels LIKE ?")
+            params.append(f"% {_FLAG_LABELS[value.lower()]} %")
+        elif key == "is" and value.lower() == "read":
+            where.append("labels NOT LIKE '% UNREAD %'")
+        elif key in ("after", "before"):
+            try:
+                ms = _epoch_ms(_parse_date(value))
+            except ValueError:
+                return None
+            where.append("internal_date >= ?" if key == "after" else "internal_date < ?")
+            params.append(ms)
+        elif key in ("newer_than", "older_than"):
+            match = re.fullmatch(r"(\d+)([dmy])", value.lower())
+            if not match:
+                return None
+            days = int(match.group(1)) * _RELATIVE_UNITS[match.group(2)]
+            ms = int((time.time() - days * 86400) * 1000)
+            where.append("internal_date >= ?" if key == "newer_than" else "internal_date < ?")
+            params.append(ms)
+        else:
+            return None
+
+    # Gmail hides spam/trash unless asked for explicitly
+    if not mailbox_scoped:
+        where.append("labels NOT LIKE '% SPAM %' AND labels NOT LIKE '% TRASH %'")
+    if words:
+        where.append("rowid IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)")
+        params.append(" ".join(words))
+
+    return " AND ".join(where) or "1 = 1", params
+
+# ==========================
+# Mirror
+# ==========================
+
+class GmailMirror:
+    """
+    Local SQLite/FTS5 copy of the newest BACKFILL_LIMIT messages of one mailbox,
+    kept current through users().history().list.
+    """
+
+    def __init__(self, path, creds):
+        self.creds = creds
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._backfill_thread = None
+        self._last_sync = 0.0
+
+    def _get_meta(self, key):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _upsert(self, rows):
+        for row in rows:
+            self._delete(row[0])
+            cur = self._db.execute("INSERT INTO messages VALUES (?,?,?,?,?,?,?,?,?)", row)
+            self._db.execute(
+                "INSERT INTO messages_fts (rowid, sender, recipients, subject, body) VALUES (?,?,?,?,?)",
+                (cur.lastrowid, row[3], row[4], row[5], row[8])
+            )
+
+    def _delete(self, msg_id):
+        found = self._db.execute("SELECT rowid FROM messages WHERE id = ?", (msg_id,)).fetchone()
+        if found:
+            self._db.execute("DELETE FROM messages_fts WHERE rowid = ?", found)
+            self._db.execute("DELETE FROM messages WHERE rowid = ?", found)
+
+    def _fetch_full(self, service, ids):
+        requests = [service.users().messages().get(userId="me", id=msg_id, format="full") for msg_id in ids]
+        return [_row(msg) for msg, error in batch_execute(service, requests) if error is None and msg]
+
+    # --- sync ---
+    @property
+    def ready(self):
+        with self._lock:
+            return self._get_meta("history_id") is not None
+
+    def is_fresh(self, service):
+        """Poll history if due; True when the mirror may answer queries."""
+        if not self.ready:
+            self._start_backfill()
+            return False
+        if time.monotonic() - self._last_sync >= SYNC_INTERVAL:
+            try:
+                self.sync(service)
+            except Exception:
+                # Still usable until MAX_STALENESS; keep a trail of why it is falling behind
+                logger.warning("Gmail mirror sync failed", exc_info=True)
+        with self._lock:
+            synced_at = float(self._get_meta("synced_at") or 0)
+        return time.time() - synced_at < MAX_STALENESS
+
+    def _start_backfill(self):
+        with self._lock:
+            if self._backfill_thread is not None and self._backfill_thread.is_alive():
+                return
+            self._backfill_thread = threading.Thread(target=self._backfill, daemon=True)
+            self._backfill_thread.start()
+
+    def _backfill(self):
+        # Background job -> dedicated client so it does not hold the tools' connection slots
+        service = build_service("gmail", "v1", self.creds)
+        history_id = execute(service.users().getProfile(userId="me"))["historyId"]
+
+        ids, page_token = [], None
+        while len(ids) < BACKFILL_LIMIT:
+            result = execute(service.users().messages().list(
+                userId="me",
+                maxResults=min(500, BACKFILL_LIMIT - len(ids)),
+                pageToken=page_token,
+                includeSpamTrash=True
+            ))
+            ids.extend(m["id"] for m in result.get("messages", []))
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                break
+        rows = self._fetch_full(service, ids)
+        labels = execute(service.users().labels().list(userId="me")).get("labels", [])
+
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM messages")
+            self._db.execute("DELETE FROM messages_fts")
+            self._upsert(rows)
+            self._db.execute("DELETE FROM labels")
+            self._db.executemany("INSERT INTO labels VALUES (?, ?)", [(l["id"], l["name"]) for l in labels])
+            # Complete mirror -> a local miss is a real miss
+            self._set_meta("complete", 0 if page_token else 1)
+            self._set_meta("history_id", history_id)
+            self._set_meta("synced_at", time.time())
+        self._last_sync = time.monotonic()
+
+    def sync(self, service):
+        with self._lock:
+            start = self._get_meta("history_id")
+
+        added, deleted, relabeled = set(), set(), {}
+        page_token = None
+        try:
+            while True:
+                result = execute(service.users().history().list(
+                    userId="me",
+                    startHistoryId=start,
+                    pageToken=page_token,
+                    historyTypes=["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"]
+                ))
+                for record in result.get("history", []):
+                    for item in record.get("messagesAdded", []):
+                        added.add(item["message"]["id"])
+                    for item in record.get("messagesDeleted", []):
+                        deleted.add(item["message"]["id"])
+                    for item in record.get("labelsAdded", []) + record.get("labelsRemoved", []):
+                        relabeled[item["message"]["id"]] = item["message"].get("labelIds", [])
+                page_token = result.get("nextPageToken")
+                if not page_token:
+                    break
+        except Exception as e:
+            if getattr(getattr(e, "resp", None), "status", None) == 404:
+                # historyId too old -> start over with a fresh backfill
+                with self._lock, self._db:
+                    self._db.execute("DELETE FROM meta WHERE key = 'history_id'")
+                self._start_backfill()
+            raise
+
+        rows = self._fetch_full(service, sorted(added - deleted))
+        with self._lock, self._db:
+            self._upsert(rows)
+            for msg_id in deleted:
+                self._delete(msg_id)
+            for msg_id, label_ids in relabeled.items():
+                if msg_id not in deleted:
+                    self._db.execute(
+                        "UPDATE messages SET labels = ? WHERE id = ?",
+                        (" " + " ".join(label_ids) + " ", msg_id)
+                    )
+            self._set_meta("history_id", result.get("historyId", start))
+            self._set_meta("synced_at", time.time())
+        self._last_sync = time.monotonic()
+
+    # --- queries ---
+    def search(self, query, n=10):
+        """
+        Messages matching a Gmail query, newest first, as dicts.
+        Returns None if the mirror cannot answer (unsupported operator, or a
+        partial mirror that might be missing older matches).
+        """
+        with self._lock:
+            label_ids = {name.lower(): lid for lid, name in self._db.execute("SELECT id, name FROM labels")}
+            translated = translate_query(query, label_ids)
+            if translated is None:
+                return None
+            where, params = translated
+            rows = self._db.execute(
+                f"SELECT id, sender, subject, snippet, body FROM messages WHERE {where} "
+                "ORDER BY internal_date DESC LIMIT ?",
+                params + [n]
+            ).fetchall()
+            complete = self._get_meta("complete") == "1"
+
+        if len(rows) < n and not complete:
+            return None
+        return [{"id": r[0], "from": r[1], "subject": r[2], "snippet": r[3], "body": r[4]} for r in rows]
+
+
+# --- Per-user registry ---
+_MIRRORS = {}
+_MIRRORS_LOCK = threading.Lock()
+_ACCOUNTS = {}            # credential_key -> account key
+
+
+def account_key(creds):
+    """
+    Key for the mailbox rather than the token: a new login (new refresh token)
+    reopens the same mirror instead of leaving the old file behind.
+    """
+    key = credential_key(creds)
+    with _MIRRORS_LOCK:
+        account = _ACCOUNTS.get(key)
+    if account is None:
+        profile = execute(get_service("gmail", "v1", creds).users().getProfile(userId="me"))
+        account = hashlib.sha256(profile["emailAddress"].lower().encode("utf-8")).hexdigest()[:32]
+        with _MIRRORS_LOCK:
+            _ACCOUNTS[key] = account
+    return account
+
+
+def _prune_stale(directory, ttl_days=MIRROR_TTL_DAYS):
+    """Delete mirror files (and their journals) untouched for ttl_days. Caller holds _MIRRORS_LOCK."""
+    cutoff = time.time() - ttl_days * 86400
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        if name.split(".")[0] in _MIRRORS:
+            continue    # open in this process
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def get_gmail_mirror(creds):
+    """The user's mirror, or None when the mirror is switched off."""
+    if not MIRROR_ENABLED:
+        return None
+    key = account_key(creds)
+    with _MIRRORS_LOCK:
+        mirror = _MIRRORS.get(key)
+        if mirror is None:
+            # Message bodies: owner-only directory and file
+            mirror = GmailMirror(private_cache_path("gmail", f"{key}.sqlite"), creds)
+            _MIRRORS[key] = mirror
+            _prune_stale(os.path.join(CACHE_DIR, "gmail"))
+        # Backfills use the newest credentials for the mailbox
+        mirror.creds = creds
+        return mirror
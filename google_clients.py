@@ -0,0 +1,442 @@
+# google_clients.py
+import hashlib
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from tracing import current_span, register_collector, span
+
+# --- Pool Settings ---
+MAX_CLIENTS = 64          # LRU bound across all users/APIs
+CLIENT_TTL = 30 * 60      # seconds before a cached client is rebuilt
+
+# Max parallel HTTP requests per (API, user); extra callers wait for a connection
+API_CONCURRENCY = {"gmail": 4, "drive": 4, "calendar": 4, "oauth2": 2}
+DEFAULT_CONCURRENCY = 4
+
+# Optional replacement for the HTTP transport: factory(credentials) -> object with
+# httplib2's request() signature. Used to run against a fake Workspace offline.
+_transport_factory = None
+
+_DISCOVERY_DOCS = {}
+_DISCOVERY_LOCK = threading.Lock()
+
+
+def credential_key(creds):
+    """Stable identity for a user's credentials (survives token refreshes)."""
+    refresh_token = getattr(creds, "refresh_token", None)
+    if refresh_token:
+        raw = f"{getattr(creds, 'client_id', '')}:{refresh_token}"
+    else:
+        raw = f"token:{getattr(creds, 'token', '')}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _discovery_doc(api, version):
+    """Discovery documents ship with googleapiclient; read each one once."""
+    from googleapiclient.discovery_cache import get_static_doc
+    key = (api, version)
+    with _DISCOVERY_LOCK:
+        if key not in _DISCOVERY_DOCS:
+            _DISCOVERY_DOCS[key] = get_static_doc(api, version)
+        return _DISCOVERY_DOCS[key]
+
+
+class _HttpPool:
+    """
+    Thread-safe stand-in for an httplib2.Http, which must not be shared across
+    threads. Each request checks out an idle AuthorizedHttp (creating one if
+    fewer than `size` exist) and returns it afterwards, so connections are
+    reused and at most `size` requests run at once.
+    """
+
+    def __init__(self, credentials, size):
+        self.credentials = credentials  # read by googleapiclient for 401 refresh handling
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if _transport_factory is not None:
+            return _transport_factory(self.credentials)
+        from google_auth_httplib2 import AuthorizedHttp
+        from googleapiclient.http import build_http
+        return AuthorizedHttp(self.credentials, http=build_http())
+
+    def request(self, *args, **kwargs):
+        with self._slots:
+            with self._lock:
+                http = self._idle.pop() if self._idle else self._connect()
+            try:
+                resp, content = http.request(*args, **kwargs)
+                # Counted on the enclosing span (API call or media download), if tracing
+                body = kwargs.get("body", args[2] if len(args) > 2 else None)
+                trace = current_span()
+                trace.add("bytes_received", len(content or b""))
+                trace.add("bytes_sent", len(body) if isinstance(body, (str, bytes)) else 0)
+                return resp, content
+            finally:
+                with self._lock:
+                    self._idle.append(http)
+
+
+class _Entry:
+    __slots__ = ("service", "creds", "created")
+
+    def __init__(self, service, creds):
+        self.service = service
+        self.creds = creds      # also keeps id(creds) in the key from being reused
+        self.created = time.monotonic()
+
+
+class ServicePool:
+    """
+    LRU/TTL cache of googleapiclient Resources keyed by (api, version, user)
+    and the Credentials object they were built with. Each session refreshes its
+    own Credentials in place, so its clients stay valid across refreshes, and
+    two sessions of the same user (each with its own token) keep separate
+    clients instead of evicting each other's. Each entry keeps its own
+    connection pool, so connections are reused and tool calls running in
+    parallel threads can share one client.
+    """
+
+    def __init__(self, max_size=MAX_CLIENTS, ttl=CLIENT_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, api, version, creds):
+        key = (api, version, credential_key(creds), id(creds))
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry.created > self.ttl:
+                    del self._entries[key]
+                    entry = None
+                else:
+                    self._entries.move_to_end(key)
+                    return entry.service
+
+        service = build_service(api, version, creds)
+
+        with self._lock:
+            self._entries[key] = _Entry(service, creds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return service
+
+    def invalidate(self, creds=None):
+        """Drop the clients built with one Credentials object, i.e. one session (or everything if None)."""
+        with self._lock:
+            if creds is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[3] == id(creds)]:
+                del self._entries[key]
+
+
+def build_service(api, version, creds):
+    """Build an unpooled client with its own transport (e.g. for background jobs)."""
+    # googleapiclient is imported on first use to keep cold starts fast
+    from googleapiclient.discovery import build, build_from_document
+    http = _HttpPool(creds, API_CONCURRENCY.get(api, DEFAULT_CONCURRENCY))
+    doc = _discovery_doc(api, version)
+    if doc is None:
+        # Not bundled with this googleapiclient version -> fall back to network discovery
+        return build(api, version, http=http, cache_discovery=False)
+    return build_from_document(doc, http=http)
+
+
+_POOL = ServicePool()
+
+
+def get_service(api, version, creds):
+    return _POOL.get(api, version, creds)
+
+
+def invalidate_services(creds=None):
+    _POOL.invalidate(creds)
+
+
+def set_transport_factory(factory):
+    """Route all API traffic through factory(credentials) (None restores the real transport)."""
+    global _transport_factory
+    _transport_factory = factory
+    # Clients built so far hold connections from the previous transport
+    _POOL.invalidate()
+
+
+# --- Call Execution ---
+# Every API call goes through execute()/batch_execute(): per-(API, user) token
+# buckets sized to Google's per-user quotas, backoff with jitter on retryable
+# errors, and coalescing of identical in-flight GETs.
+
+# (sustained units/second, burst) per user
+API_QUOTAS = {
+    "gmail": (250, 250),      # 250 quota units / user / second
+    "drive": (200, 400),      # 12,000 queries / user / minute
+    "calendar": (10, 20),     # ~600 queries / user / minute
+    "oauth2": (10, 10),
+}
+DEFAULT_QUOTA = (10, 20)
+
+# Gmail bills methods in quota units; anything not listed costs 1
+METHOD_COSTS = {
+    "gmail.users.messages.get": 5,
+    "gmail.users.messages.list": 5,
+    "gmail.users.messages.send": 100,
+    "gmail.users.drafts.create": 10,
+    "gmail.users.drafts.send": 100,
+    "gmail.users.history.list": 2,
+}
+
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5        # seconds
+BACKOFF_CAP = 16.0        # seconds
+
+BATCH_SIZE = 50           # Gmail recommends <= 50 sub-requests per batch
+BATCH_RETRIES = 3
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _status(error):
+    return getattr(getattr(error, "resp", None), "status", None)
+
+
+def _is_rate_limited(error):
+    status = _status(error)
+    # Gmail/Drive report per-user limits as 403 rateLimitExceeded / userRateLimitExceeded
+    return status == 429 or (status == 403 and ("rateLimitExceeded" in str(error) or "RateLimitExceeded" in str(error)))
+
+
+def _is_retryable(error):
+    return _status(error) in _RETRYABLE_STATUS or _is_rate_limited(error)
+
+
+class TokenBucket:
+    """
+    Token bucket that lets the balance go negative: a caller reserves its cost
+    and sleeps off the debt, so waiters are served roughly in arrival order.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, cost):
+        """Take `cost` tokens; returns how long the caller must wait first."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= cost
+            return max(0.0, -self._tokens / self.rate)
+
+
+class _InFlight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_BUCKETS = {}
+_IN_FLIGHT = {}
+_EXEC_LOCK = threading.Lock()
+_METRICS = {}
+
+
+def _metric(api):
+    # caller holds _EXEC_LOCK
+    if api not in _METRICS:
+        _METRICS[api] = {
+            "calls": 0, "retries": 0, "failures": 0, "coalesced": 0,
+            "throttled": 0, "throttle_seconds": 0.0, "queue_depth": 0, "max_queue_depth": 0,
+        }
+    return _METRICS[api]
+
+
+def api_metrics():
+    """Snapshot of per-API call, retry, throttle and queue-depth counters."""
+    with _EXEC_LOCK:
+        return {api: dict(m) for api, m in _METRICS.items()}
+
+
+register_collector("api", api_metrics, label="api", counters=(
+    "calls", "retries", "failures", "coalesced", "throttled", "throttle_seconds",
+))
+
+
+def _describe(request):
+    """(api, user, cost) of an HttpRequest."""
+    method_id = getattr(request, "methodId", None) or ""
+    api = method_id.split(".")[0] or "unknown"
+    creds = getattr(request.http, "credentials", None)
+    user = credential_key(creds) if creds is not None else ""
+    return api, user, METHOD_COSTS.get(method_id, 1)
+
+
+def _throttle(api, user, cost):
+    rate, burst = API_QUOTAS.get(api, DEFAULT_QUOTA)
+    with _EXEC_LOCK:
+        bucket = _BUCKETS.get((api, user))
+        if bucket is None:
+            bucket = _BUCKETS[(api, user)] = TokenBucket(rate, burst)
+    wait = bucket.reserve(cost)
+    if wait <= 0:
+        return
+    with _EXEC_LOCK:
+        m = _metric(api)
+        m["throttled"] += 1
+        m["throttle_seconds"] += wait
+        m["queue_depth"] += 1
+        m["max_queue_depth"] = max(m["max_queue_depth"], m["queue_depth"])
+    try:
+        time.sleep(wait)
+    finally:
+        with _EXEC_LOCK:
+            _metric(api)["queue_depth"] -= 1
+
+
+def _backoff(attempt, error=None):
+    retry_after = getattr(getattr(error, "resp", None), "get", lambda *_: None)("retry-after")
+    if retry_after and str(retry_after).isdigit():
+        return float(retry_after)
+    # "Full jitter": uniform over the exponential window
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def _call(fn, api, user, cost, idempotent, name=None):
+    """Run fn() under the rate limiter, retrying retryable failures with backoff."""
+    with span("api", name or api) as trace:
+        for attempt in range(MAX_RETRIES + 1):
+            _throttle(api, user, cost)
+            with _EXEC_LOCK:
+                _metric(api)["calls"] += 1
+            try:
+                return fn()
+            except Exception as e:
+                # Non-idempotent calls are only retried when the server rejected them
+                # up front (rate limits); a 5xx or dropped connection may have applied them.
+                retryable = _is_rate_limited(e) or (idempotent and (_is_retryable(e) or isinstance(e, OSError)))
+                if not retryable or attempt == MAX_RETRIES:
+                    with _EXEC_LOCK:
+                        _metric(api)["failures"] += 1
+                    raise
+                with _EXEC_LOCK:
+                    _metric(api)["retries"] += 1
+                trace.add("retries")
+                time.sleep(_backoff(attempt, e))
+
+
+def execute(request):
+    """
+    Execute a googleapiclient HttpRequest through the shared call layer.
+    Identical GETs for the same user that are already in flight share one call.
+    """
+    api, user, cost = _describe(request)
+    if request.method != "GET":
+        return _call(request.execute, api, user, cost, idempotent=False, name=request.methodId)
+
+    key = (user, request.uri)
+    with _EXEC_LOCK:
+        flight = _IN_FLIGHT.get(key)
+        leader = flight is None
+        if leader:
+            flight = _IN_FLIGHT[key] = _InFlight()
+        else:
+            _metric(api)["coalesced"] += 1
+
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = _call(request.execute, api, user, cost, idempotent=True, name=request.methodId)
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _EXEC_LOCK:
+            _IN_FLIGHT.pop(key, None)
+        flight.done.set()
+
+
+def execute_resumable(request, progress=None):
+    """
+    Drive a resumable media upload chunk by chunk through the call layer.
+    Each chunk is retried like an idempotent call: after a failure
+    googleapiclient asks the server how many bytes it kept and resumes from
+    there, so a dropped connection costs one chunk, not the whole upload.
+    progress(bytes_sent, total) is called after every chunk.
+    """
+    api, user, cost = _describe(request)
+    total = request.resumable.size()
+    response = None
+    with span("api", f"{request.methodId}.resumable") as trace:
+        trace.set("bytes", total)
+        while response is None:
+            status, response = _call(request.next_chunk, api, user, cost, idempotent=True, name=request.methodId)
+            trace.add("chunks")
+            if progress is not None:
+                progress(status.resumable_progress if status else total, total)
+    return response
+
+
+def batch_execute(service, requests, batch_size=BATCH_SIZE, retries=BATCH_RETRIES):
+    """
+    Run many HttpRequests through the API's batch endpoint.
+    Returns a list of (response, error) tuples in the same order as `requests`.
+    Sub-requests that fail with a retryable status are re-batched with backoff;
+    as in _call, non-GET sub-requests only when they were rate-limited (a 5xx
+    may already have been applied, and sending it again would duplicate it).
+    """
+    results = [(None, None)] * len(requests)
+    pending = list(range(len(requests)))
+    if not requests:
+        return results
+    api, user, _ = _describe(requests[0])
+
+    for attempt in range(retries + 1):
+        failed = []
+
+        def callback(request_id, response, exception):
+            index = int(request_id)
+            results[index] = (response, exception)
+            if exception is None:
+                return
+            if _is_rate_limited(exception) or (requests[index].method == "GET" and _is_retryable(exception)):
+                failed.append(index)
+
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            batch = service.new_batch_http_request(callback=callback)
+            for index in chunk:
+                batch.add(requests[index], request_id=str(index))
+            # The batch is billed per sub-request
+            cost = sum(_describe(requests[i])[2] for i in chunk)
+            idempotent = all(requests[i].method == "GET" for i in chunk)
+            _call(batch.execute, api, user, cost, idempotent, name=f"{api}.batch")
+
+        if not failed:
+            break
+        pending = sorted(failed)
+        if attempt < retries:
+            with _EXEC_LOCK:
+                _metric(api)["retries"] += len(pending)
+            time.sleep(_backoff(attempt))
+
+    return results
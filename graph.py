@@ -1,62 +1,101 @@
 import streamlit as st
 import datetime
-from langgraph.prebuilt import create_react_agent
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import SystemMessage  # <--- NEW IMPORT
+import functools
+import string
+import threading
+import time
+import uuid
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 
 # Import your tools
-from auth import get_credentials
+from auth import get_credentials, get_user_name
+from router import route
+from tool_cache import memoize_tools
+from tracing import llm_callbacks, span, trace_tools
 from tools_google import (
-    set_user_credentials,
-    get_user_name,
+    user_context, user_credentials,
     # Calendar
-    get_upcoming_events, create_event, delete_event,
+    get_upcoming_events, create_event, delete_event, bulk_delete_events,
     # Gmail
-    create_email_draft, send_email, search_emails, read_latest_email,
+    create_email_draft, bulk_create_email_drafts, send_email, search_emails, read_latest_email,
     # Drive
-    list_files, read_file_content, drive_upload
+    list_files, read_file_content, search_file_content, drive_upload, bulk_drive_upload
 )
 
+# Repeat reads within a session are served from memory; writes invalidate them.
+# The tracing wrapper sits outside, so cache hits show up as (fast) tool spans.
+tools = trace_tools(memoize_tools([
+    get_upcoming_events, create_event, delete_event, bulk_delete_events,
+    create_email_draft, bulk_create_email_drafts, send_email, search_emails, read_latest_email,
+    list_files, read_file_content, search_file_content, drive_upload, bulk_drive_upload
+]))
+TOOLS_BY_NAME = {t.name: t for t in tools}
+
 # --- LLM SETUP ---
-api_key = st.secrets["GOOGLE_API_KEY"]
-llm = ChatGoogleGenerativeAI(
-    model="gemini-flash-latest",
-    api_key=api_key,
-    temperature=0.1
-)
+def _gemini():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model="gemini-flash-latest",
+        api_key=st.secrets["GOOGLE_API_KEY"],
+        temperature=0.1
+    )
 
-tools = [
-    get_upcoming_events, create_event, delete_event,
-    create_email_draft, send_email, search_emails, read_latest_email,
-    list_files, read_file_content, drive_upload
-]
-agent = create_react_agent(llm, tools=tools)
+# Swappable for offline benchmarks (see set_llm_factory)
+_llm_factory = _gemini
 
-def run_agent(user_input: str):
-    # 1. Credentials Setup
-    creds = get_credentials()
-    if not creds:
-        return "Authentication Error: Please refresh and log in again."
-    set_user_credentials(creds)
+def set_llm_factory(factory):
+    """Build the agent on factory() instead of Gemini (None restores Gemini)."""
+    global _llm_factory
+    _llm_factory = factory or _gemini
+    get_agent.clear()
 
-    # 2. CALCULATE "NOW"
-    # We explicitly tell the AI what day it is.
-    now = datetime.datetime.now().strftime("%A, %Y-%m-%d %H:%M")
-    user_name = get_user_name()
-    
-    # 3. INJECT SYSTEM PROMPT
-    # We add a hidden "System Message" at the start of the conversation
-    system_prompt = f"""
-    System Time: {now}. 
+# Built once per process on first use (not at import), shared across sessions and reruns.
+@st.cache_resource(show_spinner=False)
+def get_agent():
+    from langgraph.prebuilt import create_react_agent
+    from memory import AssistantState, get_checkpointer, make_compactor
+
+    llm = _llm_factory()
+    # Each chat session is a checkpointed thread; the hook keeps its prompt within budget
+    return create_react_agent(
+        llm,
+        tools=tools,
+        state_schema=AssistantState,
+        pre_model_hook=make_compactor(llm),
+        checkpointer=get_checkpointer(),
+    )
+
+# Tool calls emitted in the same step run in parallel threads (LangGraph's
+# ToolNode keeps results in call order). Per-API caps live in google_clients.
+TOOL_CONCURRENCY = 8
+AGENT_CONFIG = {"max_concurrency": TOOL_CONCURRENCY}
+
+# --- SYSTEM PROMPT ---
+# Compiled once; rendered per (minute, user) and memoized.
+SYSTEM_PROMPT = string.Template("""
+    System Time: $now. 
     You are a helpful AI Personal Assistant.
 
     --- DATA HANDLING RULES ---
-    1. **HIDDEN IDs**: The 'list_files' tool will return files in this format: "Filename ::: FileID".
-       - You MUST use the "FileID" internally to read or delete files.
-       - You MUST NOT show the "FileID" or the ":::" separator to the user in your final response.
-       - Example: If tool returns "Budget.pdf ::: 12345", you simply say "I found 'Budget.pdf'".
+    1. **HIDDEN IDs**: List tools return compact tables: a title line, a "col|col|..." header, then one row per item.
+       'list_files' rows are "kind|name|id"; 'get_upcoming_events' rows are "title|start|id".
+       - You MUST use the "id" column internally to read or delete files and events.
+       - You MUST NOT show IDs or the table syntax to the user in your final response.
+       - Example: If the tool returns the row "file|Budget.pdf|12345", you simply say "I found 'Budget.pdf'".
     
-    2. **SHOW THE DATA**: Copy the list of filenames into your response, but stripped of IDs.
+    2. **SHOW THE DATA**: Copy the list of names into your response, but stripped of IDs.
+
+    3. **LONG DOCUMENTS**: To answer a question about a file, use 'search_file_content' to get the relevant passages.
+       Only use 'read_file_content' when the user wants the whole document (e.g. a full summary).
+
+    4. **MORE RESULTS**: Outputs are size-limited. "[More: call again with offset=N]" or
+       "[Truncated: ...; call again with offset=N ...]" means there is more; call the same tool
+       with that offset only if the user needs the rest.
+
+    5. **BULK OPERATIONS**: To delete several events, draft the same email to several people or upload several
+       files, make ONE call to 'bulk_delete_events', 'bulk_create_email_drafts' or 'bulk_drive_upload'
+       instead of repeating the single-item tool. Report any items whose status is "failed".
 
     --- IMPORTANT RULES ---
     1. **SHOW THE DATA**: When a tool returns a list (files, emails, events), you MUST copy that list into your final response. Do NOT just say "I have listed them." 
@@ -71,27 +110,200 @@ def run_agent(user_input: str):
     [The message content in clear paragraphs]
     
     Best regards,
-    {user_name}
+    $user_name
     ------------------------------
     
-    For Calendar: When the user mentions 'tomorrow' or 'next Friday', use the System Time ({now}) to calculate the exact YYYY-MM-DD.
-    """
+    For Calendar: When the user mentions 'tomorrow' or 'next Friday', use the System Time ($now) to calculate the exact YYYY-MM-DD.
+    """)
+
+@functools.lru_cache(maxsize=256)
+def render_system_prompt(now: str, user_name: str):
+    return SYSTEM_PROMPT.substitute(now=now, user_name=user_name)
+
+def _build_inputs(user_input: str, creds, thread_id: str):
+    # Runs inside user_credentials(...) -> tools see this session's user
+    # 2. CALCULATE "NOW"
+    # We explicitly tell the AI what day it is.
+    now = datetime.datetime.now().strftime("%A, %Y-%m-%d %H:%M")
+    # Cached at login; never a network call here
+    user_name = get_user_name(creds)
     
-    inputs = {
-        "messages": [
-            SystemMessage(content=system_prompt),
-            ("user", user_input)
-        ]
+    # 3. SYSTEM PROMPT
+    # Passed via config, not stored in the thread: the compaction hook puts it
+    # in front of the (checkpointed) history on every model step. The "__"
+    # prefix keeps LangGraph from copying it into each checkpoint's metadata.
+    config = {
+        **AGENT_CONFIG,
+        "configurable": {
+            "thread_id": thread_id,
+            "__system_prompt": render_system_prompt(now, user_name),
+        },
     }
-    
-    # 4. RUN AGENT
-    result = agent.invoke(inputs)
-    
-    # 5. CLEAN OUTPUT (Fix for the [{'type': 'text'}] messy output)
-    content = result["messages"][-1].content
-    
-    # If the model returns a list of blocks (JSON style), join them into text
+    callbacks = llm_callbacks()
+    if callbacks:
+        config["callbacks"] = callbacks
+    inputs = {"messages": [("user", user_input)]}
+    return inputs, config
+
+def _text(content):
+    # Fix for the [{'type': 'text'}] messy output: join list-of-blocks content into text
     if isinstance(content, list):
-        return " ".join([block['text'] for block in content if 'text' in block])
+        return " ".join([block['text'] for block in content if isinstance(block, dict) and 'text' in block])
+    return content or ""
+
+def _run_route(fast, user_input: str, thread_id: str):
+    # Same (memoized) tool the agent would call, rendered by the router's template
+    output = TOOLS_BY_NAME[fast.tool].invoke(fast.args)
+    text = fast.render(output)
+
+    # Record the turn as if the agent had made the call, so follow-ups can use the result
+    call_id = f"route-{uuid.uuid4().hex}"
+    get_agent().update_state(
+        {"configurable": {"thread_id": thread_id}},
+        {"messages": [
+            HumanMessage(content=user_input),
+            AIMessage(content="", tool_calls=[{"name": fast.tool, "args": fast.args, "id": call_id}]),
+            ToolMessage(content=output, tool_call_id=call_id, name=fast.tool),
+            AIMessage(content=text),
+        ]},
+        as_node="agent",
+    )
+    return text
+
+def answer(user_input: str, creds, fast_path: bool = True, thread_id: str = None):
+    """
+    One turn for the given credentials: routed directly when the router matches, else the agent.
+    Turns sharing a thread_id form one conversation; without one, the turn stands alone.
+    """
+    thread_id = thread_id or uuid.uuid4().hex
+    with user_credentials(creds, session=thread_id):
+        fast = route(user_input) if fast_path else None
+        if fast:
+            with span("turn", "router"):
+                return _run_route(fast, user_input, thread_id)
+
+        inputs, config = _build_inputs(user_input, creds, thread_id)
         
-    return content
\ No newline at end of file
+        # 4. RUN AGENT
+        with span("turn", "agent"):
+            result = get_agent().invoke(inputs, config=config)
+    
+    # 5. CLEAN OUTPUT
+    return _text(result["messages"][-1].content)
+
+def run_agent(user_input: str):
+    # 1. Credentials Setup (scoped to this call, never shared with other sessions)
+    creds = get_credentials()
+    if not creds:
+        return "Authentication Error: Please refresh and log in again."
+    return answer(user_input, creds, thread_id=st.session_state.get("thread_id"))
+
+class _ToolTimer(BaseCallbackHandler):
+    """Wall time of each tool call, by tool_call_id (parallel calls are timed separately)."""
+
+    def __init__(self):
+        self.durations = {}     # tool_call_id -> seconds
+        self._started = {}      # run_id -> (tool_call_id, perf start)
+        self._lock = threading.Lock()
+
+    def on_tool_start(self, serialized, input_str, *, run_id, tool_call_id=None, **kwargs):
+        with self._lock:
+            self._started[run_id] = (tool_call_id, time.perf_counter())
+
+    def _end(self, run_id):
+        with self._lock:
+            call_id, t0 = self._started.pop(run_id, (None, None))
+            if call_id is not None:
+                self.durations[call_id] = time.perf_counter() - t0
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+def _steps(ctx, iterator, busy):
+    """
+    Advance `iterator` one item at a time inside `ctx`. Nothing is bound to the
+    consumer's context between items, so it can stop (or be garbage-collected)
+    anywhere. busy[0] accumulates time spent producing items, not rendering them.
+    """
+    while True:
+        t0 = time.perf_counter()
+        try:
+            item = ctx.run(next, iterator)
+        except StopIteration:
+            return
+        finally:
+            busy[0] += time.perf_counter() - t0
+        yield item
+
+def stream_agent(user_input: str):
+    """
+    Streaming variant of run_agent. Yields events as the ReAct loop runs:
+      ("token", text)                         - LLM output tokens for the answer
+      ("tool_start", name)                    - the agent called a tool
+      ("tool_end", name, seconds)             - the tool returned
+    """
+    creds = get_credentials()
+    if not creds:
+        yield ("token", "Authentication Error: Please refresh and log in again.")
+        return
+
+    thread_id = st.session_state.get("thread_id") or uuid.uuid4().hex
+    # Each step runs in this context, which holds the user and the turn span;
+    # no context token stays open across a yield
+    ctx = user_context(creds, session=thread_id)
+    fast = route(user_input)
+    turn = span("turn", "router" if fast else "agent")
+    ctx.run(turn.bind)
+    # The sidebar shows this session's own last turn only
+    st.session_state["trace_id"] = turn.trace_id
+
+    if fast:
+        # Simple intent: one direct tool call, no LLM round trips
+        yield ("tool_start", fast.tool)
+        t0 = time.perf_counter()
+        try:
+            text = ctx.run(_run_route, fast, user_input, thread_id)
+        except Exception as e:
+            turn.end(time.perf_counter() - t0, f"{type(e).__name__}: {e}")
+            raise
+        elapsed = time.perf_counter() - t0
+        turn.end(elapsed)
+        yield ("tool_end", fast.tool, elapsed)
+        yield ("token", text)
+        return
+
+    busy = [0.0]
+    error = None
+    inputs, config = ctx.run(_build_inputs, user_input, creds, thread_id)
+    timer = _ToolTimer()
+    config["callbacks"] = [*config.get("callbacks", []), timer]
+    stream = get_agent().stream(inputs, config=config, stream_mode=["messages", "updates"])
+    try:
+        for mode, chunk in _steps(ctx, stream, busy):
+            if mode == "messages":
+                message, metadata = chunk
+                # Only the model's own text; tool results are reported as events below
+                if metadata.get("langgraph_node") == "agent" and isinstance(message, AIMessage):
+                    text = _text(message.content)
+                    if text:
+                        yield ("token", text)
+
+            elif mode == "updates":
+                for node, update in chunk.items():
+                    for message in (update or {}).get("messages", []):
+                        if node == "agent":
+                            for call in getattr(message, "tool_calls", []):
+                                yield ("tool_start", call["name"])
+                        elif node == "tools" and isinstance(message, ToolMessage):
+                            yield ("tool_end", message.name, timer.durations.pop(message.tool_call_id, 0.0))
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        # Also runs when the consumer abandons the stream: LangGraph's cleanup
+        # must run in the context its own context tokens were set in
+        ctx.run(stream.close)
+        turn.end(busy[0], error)
@@ -0,0 +1,218 @@
+# memory.py
+import os
+import sqlite3
+import threading
+import time
+from typing import Annotated, Sequence, TypedDict
+
+from langchain_core.messages import BaseMessage, HumanMessage, RemoveMessage, SystemMessage, ToolMessage
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.graph.message import add_messages
+from langgraph.managed import RemainingSteps
+
+from utils import cache_path
+
+# --- Compaction Settings ---
+# Approximate prompt size (system prompt + summary + history) the model is sent per step
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", 8000))
+# The current turn and this many turns before it are always sent verbatim
+KEEP_TURNS = 2
+# Older tool outputs are cut to this many characters (IDs usually sit at the start)
+STALE_TOOL_CHARS = 600
+# How much of each tool output the summarizer gets to see
+SUMMARY_TOOL_CHARS = 2000
+
+# --- Checkpoint Retention ---
+# Older checkpoints of a thread are never read again: its latest state already
+# carries the summary of everything folded away
+CHECKPOINTS_PER_THREAD = 10
+THREAD_TTL_DAYS = int(os.environ.get("THREAD_TTL_DAYS", 14))   # idle threads are dropped
+PRUNE_INTERVAL = 60 * 60      # seconds between retention passes
+VACUUM_FREE_RATIO = 0.25      # vacuum once this share of the file is free pages
+
+SUMMARY_PROMPT = """Summarize the conversation below between a user and their personal assistant,
+so the assistant can continue it without seeing the original messages.
+Keep every file name together with its FileID, every event ID, email address and date that was mentioned,
+and what the user asked for. Drop pleasantries. At most 250 words.
+
+Summary so far:
+{summary}
+
+Conversation:
+{transcript}"""
+
+
+class AssistantState(TypedDict):
+    """create_react_agent's state plus a running summary of folded-away turns."""
+    messages: Annotated[Sequence[BaseMessage], add_messages]
+    remaining_steps: RemainingSteps
+    summary: str
+
+
+def _checkpoint_id_at(epoch):
+    """
+    Smallest checkpoint id (a UUIDv6, time-ordered as text) LangGraph would
+    create at `epoch`; ids comparing below it are older.
+    """
+    ticks = int(epoch * 10_000_000) + 0x01B21DD213814000   # 100 ns since 1582-10-15
+    return f"{ticks >> 28:08x}-{(ticks >> 12) & 0xFFFF:04x}-6{ticks & 0xFFF:03x}-0000-000000000000"
+
+
+def prune_checkpoints(path, keep=CHECKPOINTS_PER_THREAD, ttl_days=THREAD_TTL_DAYS):
+    """Keep the newest `keep` checkpoints per thread, drop idle threads, vacuum when worthwhile."""
+    cutoff = _checkpoint_id_at(time.time() - ttl_days * 86400)
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        with conn:
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'checkpoints'").fetchone():
+                return
+            conn.execute("""
+                DELETE FROM checkpoints WHERE thread_id IN (
+                    SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(checkpoint_id) < ?
+                )""", (cutoff,))
+            conn.execute("""
+                DELETE FROM checkpoints WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, ROW_NUMBER() OVER (
+                            PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+                        ) AS newest
+                        FROM checkpoints
+                    ) WHERE newest > ?
+                )""", (keep,))
+            conn.execute("""
+                DELETE FROM writes WHERE NOT EXISTS (
+                    SELECT 1 FROM checkpoints c
+                    WHERE c.thread_id = writes.thread_id
+                      AND c.checkpoint_ns = writes.checkpoint_ns
+                      AND c.checkpoint_id = writes.checkpoint_id
+                )""")
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if pages and free / pages > VACUUM_FREE_RATIO:
+            try:
+                conn.execute("VACUUM")
+            except sqlite3.OperationalError:
+                pass  # a turn is writing; the next pass retries
+    finally:
+        conn.close()
+
+
+_pruner = None
+
+
+def _prune_periodically(path):
+    while True:
+        try:
+            prune_checkpoints(path)
+        except sqlite3.Error:
+            pass  # retention is best effort; the checkpointer keeps working
+        time.sleep(PRUNE_INTERVAL)
+
+
+def get_checkpointer():
+    """Conversation threads persisted to SQLite in the cache directory, with retention."""
+    global _pruner
+    path = cache_path("checkpoints.sqlite")
+    conn = sqlite3.connect(path, check_same_thread=False)
+    saver = SqliteSaver(conn)
+    saver.setup()
+    if _pruner is None:
+        _pruner = threading.Thread(target=_prune_periodically, args=(path,), daemon=True)
+        _pruner.start()
+    return saver
+
+
+def _plain(content):
+    if isinstance(content, list):
+        return " ".join(block['text'] for block in content if isinstance(block, dict) and 'text' in block)
+    return content or ""
+
+
+def estimate_tokens(message):
+    """~4 characters per token; good enough for budgeting, no tokenizer needed."""
+    size = len(_plain(message.content))
+    for call in getattr(message, "tool_calls", None) or []:
+        size += len(call["name"]) + len(str(call.get("args", "")))
+    return size // 4 + 4
+
+
+def _split_turns(messages):
+    """Group messages into turns, each starting at a user message."""
+    turns = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _elide(message):
+    text = _plain(message.content)
+    if not isinstance(message, ToolMessage) or len(text) <= STALE_TOOL_CHARS:
+        return message
+    return message.model_copy(update={"content": (
+        f"{text[:STALE_TOOL_CHARS]}\n"
+        f"[Earlier output shortened: {len(text) - STALE_TOOL_CHARS} more characters; call the tool again if needed]"
+    )})
+
+
+def _transcript(messages):
+    lines = []
+    for message in messages:
+        text = _plain(message.content)
+        if isinstance(message, HumanMessage):
+            lines.append(f"User: {text}")
+        elif isinstance(message, ToolMessage):
+            lines.append(f"Tool {message.name}: {text[:SUMMARY_TOOL_CHARS]}")
+        else:
+            for call in getattr(message, "tool_calls", None) or []:
+                lines.append(f"Assistant called {call['name']}({call.get('args', {})})")
+            if text:
+                lines.append(f"Assistant: {text}")
+    return "\n".join(lines)
+
+
+def make_compactor(llm, budget=HISTORY_TOKEN_BUDGET):
+    """
+    pre_model_hook for create_react_agent. Before every model step:
+      - puts the per-turn system prompt (config["configurable"]["__system_prompt"]) first,
+      - shortens tool outputs from turns older than KEEP_TURNS,
+      - if still over budget, folds the oldest turns into a running summary
+        and removes them from the thread for good.
+    """
+    def compact(state, config):
+        system_prompt = config.get("configurable", {}).get("__system_prompt", "")
+        summary = state.get("summary") or ""
+        turns = _split_turns(state["messages"])
+        # The last turn is the one in progress
+        recent = len(turns) - 1 - KEEP_TURNS
+        turns = [[_elide(m) for m in turn] if i < recent else turn for i, turn in enumerate(turns)]
+
+        sizes = [sum(estimate_tokens(m) for m in turn) for turn in turns]
+        total = sum(sizes) + (len(system_prompt) + len(summary)) // 4
+        fold = 0
+        while fold < recent and total > budget:
+            total -= sizes[fold]
+            fold += 1
+
+        update = {}
+        if fold:
+            # Summarize the originals, not the shortened copies
+            folded = [m for turn in _split_turns(state["messages"])[:fold] for m in turn]
+            try:
+                response = llm.invoke(SUMMARY_PROMPT.format(
+                    summary=summary or "(none)", transcript=_transcript(folded)
+                ))
+                summary = _plain(response.content).strip()
+                update = {"summary": summary, "messages": [RemoveMessage(id=m.id) for m in folded]}
+            except Exception:
+                # Keep the thread as is; this step simply goes without the oldest turns
+                pass
+            turns = turns[fold:]
+
+        if summary:
+            system_prompt += f"\n\n--- EARLIER IN THIS CONVERSATION (summary) ---\n{summary}"
+        messages = [SystemMessage(content=system_prompt)] + [m for turn in turns for m in turn]
+        return {**update, "llm_input_messages": messages}
+
+    return compact
@@ -0,0 +1,144 @@
+# pdf_extract.py
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import pypdf
+
+# --- Extraction Budgets ---
+PDF_TIME_BUDGET = 20.0       # seconds per document
+PDF_CHAR_BUDGET = 200_000    # characters per document
+PAGES_PER_TASK = 16
+INLINE_PAGES = 8             # small PDFs are not worth a trip to the pool
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+PdfText = namedtuple("PdfText", "text pages_done total_pages cacheable")
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            # spawn: forking a process that runs Streamlit's threads is unsafe
+            _POOL = ProcessPoolExecutor(MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _POOL
+
+
+def _reset_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
+
+
+def _extract_range(path, start, stop, char_budget):
+    """Worker: text of pages [start, stop). Stops early once char_budget is spent."""
+    reader = pypdf.PdfReader(path)
+    pages, chars = [], 0
+    for i in range(start, stop):
+        text = reader.pages[i].extract_text() or ""
+        pages.append(text)
+        chars += len(text)
+        if chars >= char_budget:
+            break
+    return pages
+
+
+def _extract_inline(path, total, deadline, char_budget):
+    reader = pypdf.PdfReader(path)
+    pages, chars = [], 0
+    for i in range(total):
+        if time.monotonic() > deadline:
+            return pages, True
+        text = reader.pages[i].extract_text() or ""
+        pages.append(text)
+        chars += len(text)
+        if chars >= char_budget:
+            break
+    return pages, False
+
+
+def _extract_parallel(path, total, deadline, char_budget):
+    """Page ranges go to the pool; results are consumed in page order."""
+    pool = _get_pool()
+    futures = [
+        pool.submit(_extract_range, path, start, min(start + PAGES_PER_TASK, total), char_budget)
+        for start in range(0, total, PAGES_PER_TASK)
+    ]
+
+    pages, chars, timed_out = [], 0, False
+    try:
+        for start, future in zip(range(0, total, PAGES_PER_TASK), futures):
+            try:
+                chunk = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                timed_out = True
+                break
+            pages.extend(chunk)
+            chars += sum(len(t) for t in chunk)
+            # A short chunk means the worker hit the char budget on its own
+            if chars >= char_budget or len(chunk) < min(PAGES_PER_TASK, total - start):
+                break
+    finally:
+        for future in futures:
+            future.cancel()
+    return pages, timed_out
+
+
+def extract_pdf_text(source, time_budget=PDF_TIME_BUDGET, char_budget=PDF_CHAR_BUDGET):
+    """
+    Extract text from a PDF given as a file path or bytes.
+    Workers open the file by path, so the document is never copied per worker.
+    Returns PdfText; `cacheable` is False when the time budget cut it short.
+    """
+    tmp_path = None
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        fd, tmp_path = tempfile.mkstemp(suffix=".pdf")
+        with os.fdopen(fd, "wb") as f:
+            f.write(source)
+        source = tmp_path
+
+    try:
+        deadline = time.monotonic() + time_budget
+        total = len(pypdf.PdfReader(source).pages)
+
+        timed_out = False
+        if total <= INLINE_PAGES:
+            pages, timed_out = _extract_inline(source, total, deadline, char_budget)
+        else:
+            try:
+                pages, timed_out = _extract_parallel(source, total, deadline, char_budget)
+            except BrokenProcessPool:
+                _reset_pool()
+                pages, timed_out = _extract_inline(source, total, deadline, char_budget)
+
+        text = "\n".join(pages)
+        clipped = len(text) > char_budget
+        if clipped:
+            text = text[:char_budget]
+        done = len(pages)
+        if done < total or clipped:
+            # Report only the pages that made it into the text whole
+            whole, size = 0, -1
+            for page in pages:
+                size += len(page) + 1
+                if size > char_budget:
+                    break
+                whole += 1
+            reason = "time budget reached" if timed_out else "size budget reached"
+            extracted = f": pages 1–{whole} of {total} extracted" if whole else f" of a {total}-page PDF"
+            text += f"\n[Partial extract{extracted} ({reason})]"
+        # Time-limited results depend on machine load, so callers should not cache them
+        return PdfText(text, done, total, cacheable=not timed_out)
+    finally:
+        if tmp_path:
+            os.remove(tmp_path)
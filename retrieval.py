@@ -0,0 +1,105 @@
+# retrieval.py
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+
+# --- Retrieval Settings ---
+CHUNK_WORDS = 150         # words per passage
+CHUNK_OVERLAP = 30        # words shared by neighbouring passages
+BM25_K1 = 1.5
+BM25_B = 0.75
+MAX_INDEXES = 32          # per-revision indexes kept in memory
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def chunk_text(text, size=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """Split text into overlapping word windows. Returns [(start_char, end_char)]."""
+    spans = [m.span() for m in _WORD.finditer(text)]
+    if not spans:
+        return []
+    step = max(1, size - overlap)
+    chunks = []
+    for first in range(0, len(spans), step):
+        last = min(first + size, len(spans)) - 1
+        chunks.append((spans[first][0], spans[last][1]))
+        if last == len(spans) - 1:
+            break
+    return chunks
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the passages of one document.
+    The BM25 weight of every (passage, term) pair is precomputed into a sparse
+    CSC matrix, so scoring a question is a column slice and a row sum.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.chunks = chunk_text(text)
+
+        vocab, rows, cols = {}, [], []
+        for i, (start, end) in enumerate(self.chunks):
+            for word in _WORD.findall(text[start:end].lower()):
+                rows.append(i)
+                cols.append(vocab.setdefault(word, len(vocab)))
+        self.vocab = vocab
+
+        n_chunks = len(self.chunks)
+        shape = (n_chunks, len(vocab))
+        # Duplicate (row, col) pairs are summed -> term frequencies
+        tf = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64))),
+            shape=shape
+        )
+        tf.sum_duplicates()
+
+        lengths = np.asarray(tf.sum(axis=1)).ravel()
+        avg_length = lengths.mean() if n_chunks else 0.0
+        df = np.bincount(tf.indices, minlength=len(vocab))
+        idf = np.log1p((n_chunks - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        # w = idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len / avg_len)), on nonzeros only
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / (avg_length or 1.0))
+        row_of_entry = np.repeat(np.arange(n_chunks), np.diff(tf.indptr))
+        data = tf.data
+        weights = idf[tf.indices] * data * (BM25_K1 + 1) / (data + norm[row_of_entry])
+        self.weights = sparse.csr_matrix((weights, tf.indices, tf.indptr), shape=shape).tocsc()
+
+    def search(self, question, k=5):
+        """Top-k passages as [(score, start_char, end_char)], best first."""
+        cols = sorted({self.vocab[w] for w in _WORD.findall(question.lower()) if w in self.vocab})
+        if not cols or not self.chunks:
+            return []
+        scores = np.asarray(self.weights[:, cols].sum(axis=1)).ravel()
+        k = max(0, min(k, len(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), *self.chunks[i]) for i in top if scores[i] > 0]
+
+
+# --- Per-revision index cache ---
+_INDEXES = OrderedDict()
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_index(key, text):
+    """BM25 index for a document revision (`key` from doc_cache.revision_key)."""
+    if key is None:
+        return BM25Index(text)
+    with _INDEXES_LOCK:
+        if key in _INDEXES:
+            _INDEXES.move_to_end(key)
+            return _INDEXES[key]
+    index = BM25Index(text)
+    with _INDEXES_LOCK:
+        _INDEXES[key] = index
+        while len(_INDEXES) > MAX_INDEXES:
+            _INDEXES.popitem(last=False)
+    return index
@@ -0,0 +1,167 @@
+# router.py
+import re
+from collections import namedtuple
+
+from formatting import parse_table
+
+# A routed request: which tool to call, with what, and how to present the result
+Route = namedtuple("Route", "tool args render")
+
+_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+_COUNT = r"(?P<n>\d{1,2}|" + "|".join(_WORDS) + r")"
+MAX_COUNT = 50            # larger counts go to the agent
+_LEAD = r"(?:(?:please|can you|could you)\s+)?(?:show|list|get|give|tell|what are|what's|whats)?\s*(?:me\s+)?(?:all\s+)?(?:of\s+)?(?:my\s+)?"
+
+
+# A free-text capture holding any of these carries a second request
+# ("files named budget and email it to john"), which only the agent can do
+_COMPOUND = re.compile(
+    r"[,;&]|\b(?:and|then|also|plus|after that)\b"
+    r"|\b(?:e-?mail|mail|send|forward|delete|remove|cancel|draft|reply|respond|summari[sz]e"
+    r"|share|move|rename|create|schedule|upload|attach|write|archive)\w*\b"
+)
+
+
+# "my next meeting" asks for one; "my next meetings" (or "my calendar") for the default
+_SINGULAR = {"event", "meeting", "appointment", "email", "e-mail", "message"}
+
+
+def _count(match, default):
+    value = match.groupdict().get("n")
+    if not value:
+        return default
+    return int(value) if value.isdigit() else _WORDS[value]
+
+
+def _one_or(match, default):
+    return 1 if match.groupdict().get("noun") in _SINGULAR else default
+
+
+def _simple(match):
+    """False when the match needs the agent: a compound capture or an oversized count."""
+    groups = match.groupdict()
+    if any(groups.get(name) and _COMPOUND.search(groups[name]) for name in ("q", "who")):
+        return False
+    return _count(match, 0) <= MAX_COUNT
+
+
+# ==========================
+# Renderers (tool output -> chat markdown, IDs stripped)
+# ==========================
+
+def _more(output):
+    return "\n\n_There are more — ask to see the rest._" if "[More:" in output else ""
+
+
+def _render_events(output):
+    rows = parse_table(output)
+    if not rows:
+        return output
+    return "\n".join(f"- **{row['title']}** — {row['start']}" for row in rows) + _more(output)
+
+
+def _render_files(output):
+    rows = parse_table(output)
+    if not rows:
+        return output
+    lines = []
+    for kind, heading in (("folder", "**Folders**"), ("file", "**Files**")):
+        names = [row['name'] for row in rows if row['kind'] == kind]
+        if names:
+            lines.append(heading)
+            lines.extend(f"- {name}" for name in names)
+            lines.append("")
+    return "\n".join(lines).strip() + _more(output)
+
+
+def _render_emails(output):
+    rows = parse_table(output)
+    if not rows:
+        return output
+    return "\n".join(
+        f"- **{row['subject']}** — {row['from']}\n  {row['snippet']}" for row in rows
+    ) + _more(output)
+
+
+def _render_plain(output):
+    return output
+
+# ==========================
+# Grammar
+# ==========================
+# Each rule: (compiled pattern, builder(match) -> Route). Patterns must match the
+# whole (normalized) message, so anything with extra intent goes to the agent.
+
+def _events(match):
+    return Route("get_upcoming_events", {"n": _count(match, _one_or(match, 10))}, _render_events)
+
+
+def _events_year(match):
+    return Route("get_upcoming_events", {"n": _count(match, 50), "year": int(match.group("year"))}, _render_events)
+
+
+def _files(match):
+    query = (match.groupdict().get("q") or "").strip() or None
+    return Route("list_files", {"query": query}, _render_files)
+
+
+def _emails_from(match):
+    who = match.group('who').strip()
+    # Gmail reads `from:john smith` as from:john plus a free-text "smith"
+    sender = f'"{who}"' if " " in who else who
+    return Route("search_emails", {"query": f"from:{sender}", "n": _count(match, _one_or(match, 10))}, _render_emails)
+
+
+def _emails_about(match):
+    return Route("search_emails", {"query": match.group("q").strip(), "n": _count(match, 10)}, _render_emails)
+
+
+def _latest_email(match):
+    return Route("read_latest_email", {}, _render_plain)
+
+
+_EVENT_NOUN = r"(?P<noun>events?|meetings?|appointments?|calendar(?: events)?|schedule)"
+_MAIL_NOUN = r"(?:e-?mails?|mails?|messages?)"
+# Words that start a filter the name search can't express ("from last week", "shared with bob")
+_NOT_A_NAME = (r"(?:from|in|on|about|by|for|to|of|with|named|called|related|that|which|where|shared"
+               r"|modified|created|edited|owned|since|before|after|last|this|my drive)\b")
+
+_RULES = [
+    (re.compile(_LEAD + r"(?:next|upcoming)\s+(?:" + _COUNT + r"\s+)?(?:upcoming\s+)?" + _EVENT_NOUN), _events),
+    (re.compile(_LEAD + r"(?:" + _COUNT + r"\s+)?(?:upcoming|next)?\s*" + _EVENT_NOUN + r"(?:\s+(?:coming up|upcoming))?"), _events),
+    (re.compile(_LEAD + r"(?:" + _COUNT + r"\s+)?" + _EVENT_NOUN + r"\s+(?:in|for|during)\s+(?P<year>20\d\d)"), _events_year),
+    (re.compile(_LEAD + r"(?:drive\s+)?(?:files|documents|docs)(?:\s+(?:in|on)\s+(?:my\s+)?drive)?"), _files),
+    (re.compile(_LEAD + r"(?:drive\s+)?(?:files|documents|docs)(?:\s+(?:in|on)\s+(?:my\s+)?drive)?\s+"
+                r"(?:named|called|matching|containing|with)\s+(?:the\s+name\s+)?(?P<q>.+)"), _files),
+    (re.compile(r"(?:find|search(?: for)?)\s+(?:my\s+)?(?:drive\s+)?(?:files?|documents?|docs?)\s+"
+                r"(?:(?:named|called|titled|matching|containing|about|on|related to)\s+)?"
+                r"(?!" + _NOT_A_NAME + r")(?P<q>.+)"), _files),
+    (re.compile(_LEAD + r"(?:" + _COUNT + r"\s+)?(?:latest\s+|recent\s+)?(?P<noun>" + _MAIL_NOUN + r")\s+from\s+(?P<who>[\w.@+\- ]+)"), _emails_from),
+    (re.compile(r"(?:search|find)\s+(?:my\s+)?" + _MAIL_NOUN + r"\s+(?:for|about)\s+(?P<q>.+)"), _emails_about),
+    (re.compile(r"(?:read|show|open|what(?:'s| is))\s+(?:me\s+)?(?:my\s+)?(?:the\s+)?(?:latest|last|most recent|newest)\s+" + _MAIL_NOUN), _latest_email),
+]
+
+
+def normalize(text):
+    text = text.strip().lower()
+    text = re.sub(r"[?!.]+$", "", text)
+    return re.sub(r"\s+", " ", text)
+
+
+def route(user_input):
+    """
+    Match simple, high-confidence requests to a single tool call.
+    Returns a Route, or None when the request needs the agent.
+    """
+    text = normalize(user_input)
+    # A bare noun ("docs", "calendar") is too vague to act on
+    if len(text) > 120 or " " not in text:
+        return None
+    for pattern, build in _RULES:
+        match = pattern.fullmatch(text)
+        if match:
+            return build(match) if _simple(match) else None
+    return None
@@ -0,0 +1,146 @@
+# tool_cache.py
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.tools import StructuredTool
+
+from google_clients import credential_key
+from tools_google import get_safe_creds, get_session_id
+from tracing import register_collector
+
+# --- Memoization Settings ---
+# Seconds a read tool's result stays valid within a session.
+# read_file_content / search_file_content are not listed: their text is already
+# cached per file revision (doc_cache.py), which a fixed TTL would only make stale.
+TOOL_TTLS = {
+    "get_upcoming_events": 60,
+    "search_emails": 30,
+    "read_latest_email": 15,
+    "list_files": 120,
+    "find_file": 120,
+}
+
+# Write tool -> read tools whose cached results it makes stale
+INVALIDATES = {
+    "create_event": ["get_upcoming_events"],
+    "delete_event": ["get_upcoming_events"],
+    "send_email": ["search_emails", "read_latest_email"],
+    "create_email_draft": ["search_emails", "read_latest_email"],
+    "drive_upload": ["list_files", "find_file"],
+    "bulk_delete_events": ["get_upcoming_events"],
+    "bulk_create_email_drafts": ["search_emails", "read_latest_email"],
+    "bulk_drive_upload": ["list_files", "find_file"],
+}
+
+MAX_ENTRIES = 1024
+
+
+class ToolResultCache:
+    """LRU of tool results keyed by (user, session, tool, normalized args), each with its own expiry."""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (expires_at, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, result, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user, tool_names):
+        """Drop the user's results for tool_names in every session: a write changes what all of them see."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == user and k[2] in tool_names]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+_CACHE = ToolResultCache()
+
+
+def _normalize(tool, kwargs):
+    """Canonical argument string: schema defaults filled in, keys sorted."""
+    if tool.args_schema is not None:
+        try:
+            kwargs = tool.args_schema(**kwargs).model_dump()
+        except Exception:
+            pass
+    return json.dumps(kwargs, sort_keys=True, default=str)
+
+
+def _is_error(result):
+    return isinstance(result, str) and result.startswith(("Error", "Failed", "Auth Error"))
+
+
+def _memoized(tool, ttl):
+    def run(**kwargs):
+        user = credential_key(get_safe_creds())
+        key = (user, get_session_id(), tool.name, _normalize(tool, kwargs))
+        cached = _CACHE.get(key)
+        if cached is not None:
+            return cached
+        result = tool.func(**kwargs)
+        if not _is_error(result):
+            _CACHE.put(key, result, ttl)
+        return result
+    return run
+
+
+def _invalidating(tool, stale):
+    def run(**kwargs):
+        result = tool.func(**kwargs)
+        # Drop stale reads even if the write reported an error: it may have half-applied
+        _CACHE.invalidate(credential_key(get_safe_creds()), stale)
+        return result
+    return run
+
+
+def memoize_tools(tools):
+    """
+    Wrap @tool functions: reads listed in TOOL_TTLS are memoized per session,
+    writes listed in INVALIDATES clear the reads they affect. Other tools pass through.
+    """
+    wrapped = []
+    for tool in tools:
+        if tool.name in TOOL_TTLS:
+            func = _memoized(tool, TOOL_TTLS[tool.name])
+        elif tool.name in INVALIDATES:
+            func = _invalidating(tool, INVALIDATES[tool.name])
+        else:
+            wrapped.append(tool)
+            continue
+        wrapped.append(StructuredTool.from_function(
+            func=func,
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+        ))
+    return wrapped
+
+
+def tool_cache_stats():
+    return _CACHE.stats()
+
+
+register_collector("tool_cache", tool_cache_stats, counters=("hits", "misses"))
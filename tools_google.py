@@ -1,63 +1,125 @@
 # tools_google.py
-from langchain.tools import tool
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload , MediaIoBaseDownload
-import io
+from langchain_core.tools import tool
+import os
+import contextvars
+import logging
+from contextlib import contextmanager
 import datetime
 import base64
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
-import pypdf  
-import docx  
-
-# --- Global Credential Handling ---
-_ACTIVE_CREDENTIALS = None
+from google_clients import get_service, batch_execute, credential_key, execute
+from drive_index import get_drive_index
+from gmail_mirror import get_gmail_mirror
+from calendar_cache import get_calendar_cache
+from doc_cache import get_document_cache, revision_key
+from formatting import budget_for, clip, table
+from tracing import current_span, span
+from drive_io import (
+    DownloadTooLarge, check_size, download_spooled, download_text, download_to_path,
+    spool_base64, spool_text, upload_stream,
+)
+
+logger = logging.getLogger(__name__)
+
+# Heavy parsers (pypdf, python-docx, numpy/scipy) are imported inside the
+# tools that need them, so importing this module stays cheap.
+
+# --- Per-Session Credential Handling ---
+# A ContextVar instead of a module global: each Streamlit session (script thread)
+# sees only its own credentials, and LangGraph copies the context into the
+# worker threads that run tool calls.
+_ACTIVE_CREDENTIALS = contextvars.ContextVar("active_credentials", default=None)
+_ACTIVE_SESSION = contextvars.ContextVar("active_session", default=None)
 
 def set_user_credentials(creds):
-    global _ACTIVE_CREDENTIALS
-    _ACTIVE_CREDENTIALS = creds
+    """Bind creds to the current context. Returns a token for reset_user_credentials."""
+    return _ACTIVE_CREDENTIALS.set(creds)
 
-def get_safe_creds():
-    if _ACTIVE_CREDENTIALS is None:
-        raise ValueError("Auth Error: Credentials not set.")
-    return _ACTIVE_CREDENTIALS
+def reset_user_credentials(token):
+    _ACTIVE_CREDENTIALS.reset(token)
 
-def get_user_name():
-    """Fetch the full name from the Google Profile of the CURRENT user."""
+@contextmanager
+def user_credentials(creds, session=None):
+    """Run a block (e.g. one agent invocation) as the given user, in chat session `session`."""
+    token = set_user_credentials(creds)
+    session_token = _ACTIVE_SESSION.set(session)
     try:
-        creds = get_safe_creds()
-        # Connect to Google's User Info API
-        service = build('oauth2', 'v2', credentials=creds)
-        user_info = service.userinfo().get().execute()
-        
-        # Return the user's real name, or "AI Assistant" if hidden
-        return user_info.get('name', 'AI Assistant') 
-        
-    except Exception as e:
-        # If API fails (e.g. internet issue), fall back to neutral name
-        return "AI Assistant"
+        yield creds
+    finally:
+        _ACTIVE_SESSION.reset(session_token)
+        reset_user_credentials(token)
+
+def _bind_user(creds, session):
+    _ACTIVE_CREDENTIALS.set(creds)
+    _ACTIVE_SESSION.set(session)
+
+def user_context(creds, session=None):
+    """
+    A copy of the current context bound to the user. For work done in steps
+    (a generator): run each step with ctx.run(...) rather than holding
+    user_credentials() open across a yield.
+    """
+    ctx = contextvars.copy_context()
+    ctx.run(_bind_user, creds, session)
+    return ctx
+
+def get_session_id():
+    """The chat session (thread_id) of the current tool call, or None outside one."""
+    return _ACTIVE_SESSION.get()
+
+def get_safe_creds():
+    creds = _ACTIVE_CREDENTIALS.get()
+    if creds is None:
+        raise ValueError("Auth Error: Credentials not set.")
+    return creds
 
 # --- Service Builders ---
+# Clients are pooled per user (see google_clients.py), so warm calls skip build().
 def gmail_service():
-    return build("gmail", "v1", credentials=get_safe_creds())
+    return get_service("gmail", "v1", get_safe_creds())
 
 def calendar_service():
-    return build("calendar", "v3", credentials=get_safe_creds())
+    return get_service("calendar", "v3", get_safe_creds())
 
 def drive_service():
-    return build("drive", "v3", credentials=get_safe_creds())
+    return get_service("drive", "v3", get_safe_creds())
+
+# --- Bulk Settings ---
+BULK_MAX_ITEMS = 100          # items accepted by one bulk tool call
+BULK_UPLOAD_CONCURRENCY = 4   # media uploads can't be batched -> bounded parallel requests
+
+def _http_status(error):
+    return getattr(getattr(error, "resp", None), "status", None)
+
+def _error_detail(error):
+    reason = getattr(error, "reason", None) or str(error)
+    return f"{_http_status(error)} {reason}" if _http_status(error) else reason
+
+def _bulk_report(tool_name, rows):
+    """Per-item outcome table (item|status|detail), failures first."""
+    failed = [row for row in rows if row[1] == "failed"]
+    heading = f"results ({len(rows) - len(failed)} ok, {len(failed)} failed)"
+    return table(heading, ("item", "status", "detail"),
+                 failed + [row for row in rows if row[1] != "failed"],
+                 budget=budget_for(tool_name), pageable=False)
 
 # ==========================
 # 📅 CALENDAR TOOLS
 # ==========================
 
+def _to_epoch(rfc3339):
+    return datetime.datetime.fromisoformat(rfc3339.replace('Z', '+00:00')).timestamp()
+
 @tool
-def get_upcoming_events(n: int = 10, year: int = None):
+def get_upcoming_events(n: int = 10, year: int = None, offset: int = 0):
     """
     Get calendar events.
     Args:
         n: Number of events to retrieve (default 10).
         year: (Optional) A specific 4-digit year (e.g., 2026) to list events for.
               If not provided, lists upcoming events starting from strictly right now.
+        offset: Skip this many events (to page through long lists).
     """
     service = calendar_service()
     
@@ -70,27 +132,45 @@ def get_upcoming_events(n: int = 10, year: int = None):
         time_min = datetime.datetime.utcnow().isoformat() + 'Z'
         time_max = None
 
-    events_result = service.events().list(
-        calendarId='primary',
-        timeMin=time_min,
-        timeMax=time_max,
-        maxResults=n,
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
-    
-    events = events_result.get('items', [])
-    if not events:
+    # One extra event tells us whether there is another page
+    limit = offset + n + 1
+    events = None
+    try:
+        # Answer from the synced in-memory calendar when it covers the range
+        cache = get_calendar_cache(get_safe_creds())
+        if cache.ensure_fresh(service):
+            events = cache.between(
+                _to_epoch(time_min),
+                _to_epoch(time_max) if time_max else None,
+                limit
+            )
+    except Exception:
+        logger.exception("Calendar cache lookup failed; falling back to a live query")
+    if events is None:
+        events_result = execute(service.events().list(
+            calendarId='primary',
+            timeMin=time_min,
+            timeMax=time_max,
+            maxResults=limit,
+            singleEvents=True,
+            orderBy='startTime'
+        ))
+        events = events_result.get('items', [])
+
+    page = events[offset:offset + n]
+    if not page:
         period = f"the year {year}" if year else "the future"
-        return f"No events found for {period}."
+        return f"No {'more ' if offset else ''}events found for {period}."
 
-    result = []
-    for event in events:
+    rows = []
+    for event in page:
         # Handle full datetime (2025-01-01T10:00:00) vs all-day events (2025-01-01)
         start = event['start'].get('dateTime', event['start'].get('date'))
-        result.append(f"Event: {event['summary']} | Time: {start} | ID: {event['id']}")
+        rows.append((event.get('summary', '(No title)'), start, event['id']))
     
-    return "\n".join(result)
+    return table("events", ("title", "start", "id"), rows,
+                 budget=budget_for("get_upcoming_events"), offset=offset,
+                 has_more=len(events) > offset + n)
 
 @tool
 def create_event(title: str, date: str, time: str):
@@ -112,7 +192,9 @@ def create_event(title: str, date: str, time: str):
             "timeZone": my_timezone
         },
     }
-    event = service.events().insert(calendarId="primary", body=event).execute()
+    event = execute(service.events().insert(calendarId="primary", body=event))
+    # Write-through so the next listing sees it without a re-sync
+    get_calendar_cache(get_safe_creds()).put(event)
     return f"Event created: {event.get('htmlLink')}"
 
 @tool
@@ -120,28 +202,86 @@ def delete_event(event_id: str):
     """Delete a calendar event by its ID."""
     try:
         service = calendar_service()
-        service.events().delete(calendarId='primary', eventId=event_id).execute()
+        execute(service.events().delete(calendarId='primary', eventId=event_id))
+        get_calendar_cache(get_safe_creds()).remove(event_id)
         return f"Event {event_id} deleted successfully."
     except Exception as e:
         return f"Failed to delete event: {str(e)}"
 
+@tool
+def bulk_delete_events(event_ids: list[str]):
+    """
+    Delete several calendar events in one call (use instead of repeated delete_event).
+    Args:
+        event_ids: IDs of the events to delete.
+    """
+    if len(event_ids) > BULK_MAX_ITEMS:
+        return f"Error: at most {BULK_MAX_ITEMS} events per call."
+    service = calendar_service()
+    cache = get_calendar_cache(get_safe_creds())
+    # One batch HTTP request (per 50 events) instead of one round trip each
+    requests = [service.events().delete(calendarId='primary', eventId=event_id) for event_id in event_ids]
+
+    rows = []
+    for event_id, (_, error) in zip(event_ids, batch_execute(service, requests)):
+        if error is None:
+            cache.remove(event_id)
+            rows.append((event_id, "deleted", ""))
+        elif _http_status(error) == 410:
+            cache.remove(event_id)
+            rows.append((event_id, "deleted", "was already deleted"))
+        else:
+            rows.append((event_id, "failed", _error_detail(error)))
+    return _bulk_report("bulk_delete_events", rows)
+
 # ==========================
 # 📧 GMAIL TOOLS
 # ==========================
 
+def _raw_message(to, subject, body):
+    message = MIMEText(body)
+    message['to'] = to
+    message['subject'] = subject
+    return base64.urlsafe_b64encode(message.as_bytes()).decode()
+
 @tool
 def create_email_draft(to: str, subject: str, body: str):
     """Create a draft email (safer than sending directly)."""
     service = gmail_service()
-    message = MIMEText(body)
-    message['to'] = to
-    message['subject'] = subject
-    raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
+    raw = _raw_message(to, subject, body)
     
     draft_body = {'message': {'raw': raw}}
-    draft = service.users().drafts().create(userId="me", body=draft_body).execute()
+    draft = execute(service.users().drafts().create(userId="me", body=draft_body))
     return f"Draft created. ID: {draft['id']}"
 
+@tool
+def bulk_create_email_drafts(recipients: list[str], subject: str, body: str):
+    """
+    Create the same draft for several recipients in one call (one draft each).
+    Args:
+        recipients: Email addresses, one draft per address.
+        subject: Subject line for every draft.
+        body: Message body; '{recipient}' is replaced with each draft's address.
+    """
+    if len(recipients) > BULK_MAX_ITEMS:
+        return f"Error: at most {BULK_MAX_ITEMS} drafts per call."
+    service = gmail_service()
+    requests = [
+        service.users().drafts().create(userId="me", body={'message': {
+            'raw': _raw_message(to, subject, body.replace("{recipient}", to))
+        }})
+        for to in recipients
+    ]
+
+    rows = []
+    # Not idempotent: batch_execute only re-sends drafts the server rejected up front
+    for to, (draft, error) in zip(recipients, batch_execute(service, requests)):
+        if error is None and draft:
+            rows.append((to, "drafted", f"draft {draft['id']}"))
+        else:
+            rows.append((to, "failed", _error_detail(error) if error else "empty response"))
+    return _bulk_report("bulk_create_email_drafts", rows)
+
 @tool
 def send_email(to: str, subject: str, body: str):
     """Send an email immediately."""
@@ -150,24 +290,72 @@ def send_email(to: str, subject: str, body: str):
     message['to'] = to
     message['subject'] = subject
     raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
-    service.users().messages().send(userId="me", body={"raw": raw}).execute()
+    execute(service.users().messages().send(userId="me", body={"raw": raw}))
     return f"Email sent to {to}"
 
+def _search_mirror(service, query, n):
+    """Mirror hits for a Gmail query, or None if the API has to answer."""
+    mirror = get_gmail_mirror(get_safe_creds())
+    if mirror is None:
+        return None
+    try:
+        if not mirror.is_fresh(service):
+            return None
+        return mirror.search(query, n)
+    except Exception:
+        # Still answer through the API, but leave a trail (a corrupt mirror would otherwise go unnoticed)
+        current_span().add("mirror_errors")
+        logger.warning("Gmail mirror lookup failed; falling back to the API", exc_info=True)
+        return None
+
+def _email_table(rows, offset, has_more):
+    return table("emails", ("from", "subject", "snippet"), rows,
+                 budget=budget_for("search_emails"), offset=offset, has_more=has_more)
+
 @tool
-def search_emails(query: str):
-    """Search for emails using Gmail queries (e.g., 'from:boss', 'subject:meeting')."""
+def search_emails(query: str, n: int = 10, offset: int = 0):
+    """
+    Search for emails using Gmail queries (e.g., 'from:boss', 'subject:meeting').
+    Args:
+        query: Gmail search query.
+        n: Max results (default 10).
+        offset: Skip this many results (to page through long lists).
+    """
     service = gmail_service()
-    results = service.users().messages().list(userId="me", q=query, maxResults=5).execute()
-    messages = results.get('messages', [])
+    limit = offset + n + 1
+
+    # Optional local mirror answers without a round trip while it is fresh
+    local = _search_mirror(service, query, limit)
+    if local is not None:
+        page = local[offset:offset + n]
+        if not page:
+            return f"No {'more ' if offset else ''}emails found matching that query."
+        rows = [(m['from'], m['subject'], m['snippet']) for m in page]
+        return _email_table(rows, offset, len(local) > offset + n)
+
+    results = execute(service.users().messages().list(userId="me", q=query, maxResults=limit))
+    found = results.get('messages', [])
+    messages = found[offset:offset + n]
     
     if not messages:
-        return "No emails found matching that query."
+        return f"No {'more ' if offset else ''}emails found matching that query."
     
-    # Fetch details for the found emails
-    output = []
-    for msg in messages:
-        # FIX: format must be 'metadata' (which includes the snippet), not 'snippet'
-        m = service.users().messages().get(userId="me", id=msg['id'], format="metadata").execute()
+    # Fetch details for all hits in one batch round trip (only From/Subject headers + snippet)
+    requests = [
+        service.users().messages().get(
+            userId="me",
+            id=msg['id'],
+            format="metadata",
+            metadataHeaders=["From", "Subject"],
+            fields="id,snippet,payload/headers"
+        )
+        for msg in messages
+    ]
+
+    rows = []
+    for m, error in batch_execute(service, requests):
+        if error is not None or m is None:
+            continue
         
         snippet = m.get('snippet', 'No snippet available')
         
@@ -176,19 +364,26 @@ def search_emails(query: str):
         subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '(No Subject)')
         sender = next((h['value'] for h in headers if h['name'] == 'From'), '(Unknown)')
         
-        output.append(f"From: {sender} | Subject: {subject} | Snippet: {snippet}")
+        rows.append((sender, subject, snippet))
     
-    return "\n".join(output)
+    if not rows:
+        return "Found matching emails, but failed to fetch their details."
+    return _email_table(rows, offset, len(found) > offset + n or 'nextPageToken' in results)
 
 @tool
 def read_latest_email(query: str = "label:INBOX"):
     """Read the latest email."""
     service = gmail_service()
-    msgs = service.users().messages().list(userId="me", q=query, maxResults=1).execute()
+
+    local = _search_mirror(service, query, 1)
+    if local:
+        return f"Latest email: {local[0]['snippet']}"
+
+    msgs = execute(service.users().messages().list(userId="me", q=query, maxResults=1))
     if "messages" not in msgs:
         return "Inbox is empty."
     msg_id = msgs["messages"][0]["id"]
-    msg = service.users().messages().get(userId="me", id=msg_id, format="full").execute()
+    msg = execute(service.users().messages().get(userId="me", id=msg_id, format="full"))
     snippet = msg.get("snippet", "")
     return f"Latest email: {snippet}"
 
@@ -196,51 +391,64 @@ def read_latest_email(query: str = "label:INBOX"):
 # 📂 DRIVE TOOLS
 # ==========================
 
-# tools_google.py
+def _search_drive(name, n):
+    """
+    Name search over 'My Drive'. Served from the local metadata index; while the
+    index is still doing its first crawl, falls back to a live files().list query.
+    """
+    service = drive_service()
+    index = None
+    try:
+        index = get_drive_index(get_safe_creds())
+        if index.ensure_fresh(service):
+            return index.search(name, n)
+    except Exception:
+        # Still answer with a live query, but leave a trail
+        if index is not None:
+            index.errors += 1
+        current_span().add("index_errors")
+        logger.exception("Drive index lookup failed; falling back to a live query")
 
-# ... (keep your service functions and other tools) ...
+    q = "trashed = false and 'me' in owners"
+    if name:
+        q += f" and name contains '{name}'"
+
+    results = execute(service.files().list(
+        pageSize=n, 
+        fields="nextPageToken, files(id, name, mimeType, shortcutDetails)", 
+        q=q,
+        orderBy="folder,name"
+    ))
+    return results.get('files', [])
 
 @tool
-def list_files(query: str = None, n: int = 30):
+def list_files(query: str = None, n: int = 30, offset: int = 0):
     """
     List files in 'My Drive' (Owned by me).
     Args:
         query: (Optional) Name to search for.
         n: Max results (default 30).
+        offset: Skip this many results (to page through long lists).
     """
-    service = drive_service()
-    
-    q = "trashed = false and 'me' in owners"
-    
+    clean_name = None
     if query:
         clean_name = query.replace("'", "").replace('"', "")
         if "name =" in clean_name or "name contains" in clean_name:
             clean_name = clean_name.split()[-1]
-        q += f" and name contains '{clean_name}'"
 
-    results = service.files().list(
-        pageSize=n, 
-        fields="nextPageToken, files(id, name, mimeType, shortcutDetails)", 
-        q=q,
-        orderBy="folder,name"
-    ).execute()
-    
-    items = results.get('files', [])
+    found = _search_drive(clean_name, offset + n + 1)
+    items = found[offset:offset + n]
 
     if not items:
+        if offset:
+            return f"No more files found matching '{query}'."
         return f"No files found matching '{query}'."
     
     # --- GROUPING LOGIC ---
-    folders_list = []
-    files_list = []
-
+    # Folders first (results already come ordered that way), then files
+    rows = []
     for item in items:
-        name = item.get('name')
-        file_id = item.get('id')
         mime = item.get('mimeType')
-        
-        # We append the ID with a separator ":::" so the Agent sees it
-        entry = f"{name} ::: {file_id}"
 
         # Shortcut logic
         is_shortcut = (mime == 'application/vnd.google-apps.shortcut')
@@ -249,22 +457,14 @@ def list_files(query: str = None, n: int = 30):
             target_mime = item.get('shortcutDetails', {}).get('targetMimeType', '')
 
         # Folder Logic
-        if mime == 'application/vnd.google-apps.folder' or 'folder' in target_mime:
-            folders_list.append(entry)
-        else:
-            files_list.append(entry)
+        kind = "folder" if mime == 'application/vnd.google-apps.folder' or 'folder' in target_mime else "file"
+        rows.append((kind, item.get('name'), item.get('id')))
 
-    output = []
-    if folders_list:
-        output.append("--- FOLDERS ---")
-        output.extend(folders_list)
-        output.append("")
-        
-    if files_list:
-        output.append("--- FILES ---")
-        output.extend(files_list)
-        
-    return "\n".join(output)
+    rows.sort(key=lambda row: row[0] != "folder")
+    # The id column is for the agent's follow-up calls only
+    return table("files", ("kind", "name", "id"), rows,
+                 budget=budget_for("list_files"), offset=offset,
+                 has_more=len(found) > offset + n)
 
 @tool
 def find_file(name: str):
@@ -275,23 +475,12 @@ def find_file(name: str):
     Returns:
         The exact full name(s) if found, or 'The file does not exist'.
     """
-    service = drive_service()
-    
     # Sanitize
     clean_name = name.replace("'", "").replace('"', "")
     if "name =" in clean_name:
         clean_name = clean_name.split()[-1]
 
-    # Search query
-    q = f"trashed = false and 'me' in owners and name contains '{clean_name}'"
-
-    results = service.files().list(
-        pageSize=10, 
-        fields="files(name)", 
-        q=q
-    ).execute()
-    
-    items = results.get('files', [])
+    items = _search_drive(clean_name, 10)
 
     if not items:
         return "The file does not exist."
@@ -300,75 +489,233 @@ def find_file(name: str):
     found_names = [item['name'] for item in items]
     return "Found:\n" + "\n".join(found_names)
 
+GOOGLE_DOC_MIME = 'application/vnd.google-apps.document'
+DOCX_MIME = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+DOC_META_FIELDS = "id, name, mimeType, modifiedTime, md5Checksum, headRevisionId, size"
+
+class UnreadableFile(Exception):
+    """A Drive file that cannot be turned into text; the message is shown to the agent."""
+
+def _is_readable(mime_type):
+    return (
+        mime_type in (GOOGLE_DOC_MIME, 'application/pdf', DOCX_MIME, 'application/json')
+        or mime_type.startswith('text/')
+    )
+
+def _extract_text(service, file_meta):
+    """Download a file and turn it into text (uncached). Returns (text, cacheable)."""
+    file_id = file_meta['id']
+    mime_type = file_meta.get('mimeType')
+
+    # DOWNLOAD LOGIC (chunked, with a byte ceiling; nothing is buffered whole in memory)
+    check_size(file_meta)
+
+    if mime_type == GOOGLE_DOC_MIME:
+        # Case A: Google Doc -> Export to plain text
+        request = service.files().export_media(fileId=file_id, mimeType='text/plain')
+        return _text_result(*download_text(request))
+
+    request = service.files().get_media(fileId=file_id)
+
+    # --- PDF Handling --- (workers open the spooled file by path)
+    if mime_type == 'application/pdf':
+        from pdf_extract import extract_pdf_text
+        path = download_to_path(request, suffix=".pdf")
+        try:
+            # Page ranges are extracted in a process pool under time/size budgets
+            with span("pdf", "extract_pdf_text") as trace:
+                pdf = extract_pdf_text(path)
+                trace.set("pages", pdf.pages_done)
+                trace.set("chars", len(pdf.text))
+            return pdf.text, pdf.cacheable
+        except Exception as e:
+            raise UnreadableFile(f"Error parsing PDF: {e}")
+        finally:
+            os.remove(path)
+
+    # --- Word (.docx) Handling ---
+    elif mime_type == DOCX_MIME:
+        import docx
+        with download_spooled(request) as file_stream:
+            try:
+                doc = docx.Document(file_stream)
+                text = [para.text for para in doc.paragraphs]
+                return "\n".join(text), True
+            except Exception as e:
+                raise UnreadableFile(f"Error parsing Word Doc: {e}")
+
+    # --- Plain Text / Code Handling ---
+    return _text_result(*download_text(request))
+
+def _text_result(text, truncated):
+    if truncated:
+        text += f"\n[Truncated: first {len(text)} characters shown]"
+    return text, True
+
+def _content_header(file_meta):
+    """Title line for a document's text. Not cached with it, so a rename shows at once."""
+    kind = {'application/pdf': "PDF", DOCX_MIME: "Word"}.get(file_meta.get('mimeType'))
+    return f"--- Content of {file_meta.get('name')} ({kind}) ---\n" if kind else ""
+
+def _read_document(file_id):
+    """
+    (file_meta, text, revision_key) of a Drive file. One cheap metadata call
+    decides whether the parsed text cached for this revision can be reused;
+    otherwise download + parse.
+    """
+    service = drive_service()
+    file_meta = execute(service.files().get(fileId=file_id, fields=DOC_META_FIELDS))
+    mime_type = file_meta.get('mimeType', '')
+
+    if not _is_readable(mime_type):
+        raise UnreadableFile(
+            f"Error: Unsupported file type ({mime_type}). I can only read Google Docs, PDFs, Word, and Text files."
+        )
+
+    cache = get_document_cache()
+    user = credential_key(get_safe_creds())
+    key = revision_key(file_meta)
+    if key:
+        text = cache.get(user, key)
+        if text is not None:
+            return file_meta, text, key
+
+    text, cacheable = _extract_text(service, file_meta)
+    if key and cacheable:
+        cache.put(user, key, text)
+    return file_meta, text, key
+
 @tool
-def read_file_content(file_id: str):
+def read_file_content(file_id: str, offset: int = 0):
     """
     Read the content of a file. Supports Google Docs, Text, PDF, and Word (.docx).
+    Long files are returned a window at a time.
     Args:
         file_id: The Google Drive file ID.
+        offset: Character position to continue reading from.
     """
-    service = drive_service()
     try:
-        # 1. Get file metadata to check type
-        file_meta = service.files().get(fileId=file_id).execute()
-        mime_type = file_meta.get('mimeType')
-        file_name = file_meta.get('name')
-        
-        content_bytes = None
-
-        # 2. DOWNLOAD LOGIC
-        if mime_type == 'application/vnd.google-apps.document':
-            # Case A: Google Doc -> Export to plain text
-            request = service.files().export_media(fileId=file_id, mimeType='text/plain')
-            content_bytes = request.execute()
-            # Google Docs export comes as bytes, usually utf-8
-            return content_bytes.decode('utf-8')
-
-        else:
-            # Case B: Binary File (PDF, Word, Text) -> Download raw bytes
-            request = service.files().get_media(fileId=file_id)
-            content_bytes = request.execute()
-            
-            # Create a file-like object in memory
-            file_stream = io.BytesIO(content_bytes)
-
-            # 3. PARSING LOGIC based on type
-            
-            # --- PDF Handling ---
-            if mime_type == 'application/pdf':
-                try:
-                    reader = pypdf.PdfReader(file_stream)
-                    text = []
-                    for page in reader.pages:
-                        text.append(page.extract_text())
-                    return f"--- Content of {file_name} (PDF) ---\n" + "\n".join(text)
-                except Exception as e:
-                    return f"Error parsing PDF: {e}"
-
-            # --- Word (.docx) Handling ---
-            elif mime_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-                try:
-                    doc = docx.Document(file_stream)
-                    text = [para.text for para in doc.paragraphs]
-                    return f"--- Content of {file_name} (Word) ---\n" + "\n".join(text)
-                except Exception as e:
-                    return f"Error parsing Word Doc: {e}"
-
-            # --- Plain Text / Code Handling ---
-            elif mime_type.startswith('text/') or mime_type == 'application/json':
-                return content_bytes.decode('utf-8')
-
-            else:
-                return f"Error: Unsupported file type ({mime_type}). I can only read Google Docs, PDFs, Word, and Text files."
+        file_meta, text, _ = _read_document(file_id)
+        # Offsets count from the start of the document text, after the header
+        window = clip(text, budget_for("read_file_content"), offset)
+        return (_content_header(file_meta) if offset == 0 else "") + window
+    except (UnreadableFile, DownloadTooLarge) as e:
+        return str(e)
+    except Exception as e:
+        return f"Error reading file: {str(e)}"
 
+@tool
+def search_file_content(file_id: str, question: str, k: int = 5):
+    """
+    Find the passages of a file that are most relevant to a question.
+    Prefer this over read_file_content for questions about long documents.
+    Args:
+        file_id: The Google Drive file ID.
+        question: What you are looking for in the document.
+        k: Number of passages to return (default 5).
+    """
+    try:
+        file_meta, text, key = _read_document(file_id)
+        file_name = file_meta.get('name')
+    except (UnreadableFile, DownloadTooLarge) as e:
+        return str(e)
     except Exception as e:
         return f"Error reading file: {str(e)}"
 
+    # BM25 index is built once per file revision
+    from retrieval import get_index
+    hits = get_index(key, text).search(question, k)
+    if not hits:
+        return f"No passages in {file_name} matched the question."
+
+    output = [f"--- Top {len(hits)} passages from {file_name} ---"]
+    for rank, (score, start, end) in enumerate(hits, 1):
+        output.append(f"[{rank}] (chars {start}-{end}) {text[start:end]}")
+    # Passages keep their offsets, so read_file_content(offset=...) can widen any of them
+    return clip("\n\n".join(output), budget_for("search_file_content"),
+                hint="ask for fewer passages (k), or read one in full with read_file_content(offset=<its start>)")
+
+def _upload_progress(file_name):
+    """progress callback for upload_stream: bytes sent so far go on the tool's span and the debug log."""
+    trace = current_span()
+    sent = 0
+
+    def progress(done, total):
+        nonlocal sent
+        trace.add("bytes_uploaded", done - sent)
+        sent = done
+        logger.debug("Uploading %s: %d/%d bytes", file_name, done, total)
+    return progress
+
+def _upload(file_name, content, mime_type="text/plain", is_base64=False):
+    """Create a Drive file from text or base64 content and index it; returns the new file's metadata."""
+    # Spooled: small files stay in memory, large ones go to a temp file and upload in chunks
+    stream = spool_base64(content) if is_base64 else spool_text(content)
+    with stream:
+        file = upload_stream(
+            drive_service(),
+            {"name": file_name, "mimeType": mime_type},
+            stream,
+            mime_type,
+            fields="id, name, mimeType, parents, modifiedTime, ownedByMe, size",
+            progress=_upload_progress(file_name)
+        )
+    # Write-through so the new file is searchable before the next changes poll.
+    # Best effort: the upload already succeeded, and the poll picks the file up anyway
+    index = None
+    try:
+        index = get_drive_index(get_safe_creds())
+        index.upsert(file)
+    except Exception:
+        if index is not None:
+            index.errors += 1
+        current_span().add("index_errors")
+        logger.exception("Drive index write-through failed for uploaded file %s", file.get('id'))
+    return file
+
 @tool
-def drive_upload(file_name: str, content: str):
-    """Upload a text file to Drive."""
-    service = drive_service()
-    metadata = {"name": file_name}
-    media = MediaIoBaseUpload(io.BytesIO(content.encode('utf-8')), mimetype='text/plain')
-    file = service.files().create(body=metadata, media_body=media, fields="id").execute()
-    return f"Uploaded '{file_name}' with ID: {file.get('id')}"
\ No newline at end of file
+def drive_upload(file_name: str, content: str, mime_type: str = "text/plain", is_base64: bool = False):
+    """
+    Upload a file to Drive.
+    Args:
+        file_name: Name of the new file.
+        content: The file's text, or its bytes base64-encoded when is_base64 is true.
+        mime_type: MIME type of the content, e.g. "text/csv" or "application/pdf".
+        is_base64: True for binary content passed as base64.
+    """
+    try:
+        file = _upload(file_name, content, mime_type, is_base64)
+    except ValueError as e:
+        if not is_base64:
+            raise
+        return f"Error: content is not valid base64 ({e})."
+    size = int(file.get('size') or 0)
+    return f"Uploaded '{file_name}' ({mime_type}, {size:,} bytes) with ID: {file.get('id')}"
+
+@tool
+def bulk_drive_upload(file_names: list[str], contents: list[str]):
+    """
+    Upload several text files to Drive in one call.
+    Args:
+        file_names: Name of each file.
+        contents: Text of each file, in the same order as file_names.
+    """
+    if len(file_names) != len(contents):
+        return "Error: file_names and contents must have the same length."
+    if len(file_names) > BULK_MAX_ITEMS:
+        return f"Error: at most {BULK_MAX_ITEMS} files per call."
+
+    # Batch requests can't carry media, so uploads run in parallel (bounded);
+    # each task runs in a copy of this context so it sees the session's credentials
+    with ThreadPoolExecutor(max_workers=BULK_UPLOAD_CONCURRENCY) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, _upload, name, content)
+            for name, content in zip(file_names, contents)
+        ]
+        rows = []
+        for name, future in zip(file_names, futures):
+            try:
+                rows.append((name, "uploaded", future.result().get('id')))
+            except Exception as e:
+                rows.append((name, "failed", _error_detail(e)))
+    return _bulk_report("bulk_drive_upload", rows)
\ No newline at end of file
@@ -0,0 +1,397 @@
+# tracing.py
+import contextvars
+import functools
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+# --- Tracing Settings ---
+# Off by default; when off, every hook below is a single flag check.
+TRACING_ENABLED = os.environ.get("ASSISTANT_TRACING", "0") == "1"
+# Serve the OpenMetrics text on this port (e.g. for a Prometheus scrape)
+METRICS_PORT = int(os.environ.get("ASSISTANT_METRICS_PORT", "0") or 0)
+
+MAX_SPANS = 5000          # finished spans kept for the sidebar panel
+# Emails (comma-separated) that see the process-wide aggregates and Reset in the
+# sidebar; everyone else only sees their own session's last turn
+TRACE_ADMINS = {e.strip().lower() for e in os.environ.get("ASSISTANT_TRACE_ADMINS", "").split(",") if e.strip()}
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_enabled = TRACING_ENABLED
+_CURRENT = contextvars.ContextVar("current_span", default=None)
+_SPANS = deque(maxlen=MAX_SPANS)
+_STATS = {}               # (kind, name) -> _Stat
+_COLLECTORS = {}          # name -> (collect, label, counter keys); see register_collector
+_LOCK = threading.Lock()
+
+
+def is_enabled():
+    return _enabled
+
+
+def set_enabled(enabled):
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def is_admin(email):
+    return bool(email) and email.lower() in TRACE_ADMINS
+
+
+class _Stat:
+    __slots__ = ("count", "total", "max", "errors", "buckets", "counters")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.counters = {}   # numeric span attributes summed (bytes, tokens, retries)
+
+
+class Span:
+    """
+    One timed operation. kind groups spans ('turn', 'tool', 'api', 'llm', 'auth', 'pdf');
+    numeric attributes (bytes_received, tokens_in, retries, ...) are also summed per (kind, name).
+    """
+    __slots__ = ("kind", "name", "trace_id", "parent", "start", "duration", "attrs", "error", "_token", "_perf")
+
+    def __init__(self, kind, name, attrs=None, parent=None):
+        self.kind = kind
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.start = time.time()
+        self.duration = None
+        self.attrs = attrs or {}
+        self.error = None
+        self._token = None
+        self._perf = None
+
+    def set(self, key, value):
+        self.attrs[key] = value
+
+    def add(self, key, amount=1):
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+    @property
+    def depth(self):
+        depth, parent = 0, self.parent
+        while parent is not None:
+            depth, parent = depth + 1, parent.parent
+        return depth
+
+    def bind(self):
+        """
+        Make this the current span without a reset token, for a context that is
+        thrown away afterwards (contextvars.copy_context()). Close it with end().
+        """
+        _CURRENT.set(self)
+
+    def end(self, duration, error=None):
+        self.error = error
+        _finish(self, duration)
+
+    def __enter__(self):
+        self._token = _CURRENT.set(self)
+        self._perf = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _CURRENT.reset(self._token)
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _finish(self, time.perf_counter() - self._perf)
+        return False
+
+
+class _NoopSpan:
+    """Returned while tracing is off: accepts the same calls and records nothing."""
+    __slots__ = ()
+    trace_id = None
+
+    def set(self, key, value):
+        pass
+
+    def add(self, key, amount=1):
+        pass
+
+    def bind(self):
+        pass
+
+    def end(self, duration, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(kind, name, **attrs):
+    """`with span("api", "drive.files.get") as s: ...` - times the block as a child of the current span."""
+    if not _enabled:
+        return _NOOP
+    return Span(kind, name, attrs, _CURRENT.get())
+
+
+def current_span():
+    return (_CURRENT.get() if _enabled else None) or _NOOP
+
+
+def record(kind, name, duration, **attrs):
+    """Record an operation timed elsewhere (e.g. by a callback) as a finished span."""
+    if not _enabled:
+        return
+    s = Span(kind, name, attrs, _CURRENT.get())
+    s.start -= duration
+    s.error = attrs.pop("error", None)
+    _finish(s, duration)
+
+
+def _finish(s, duration):
+    s.duration = duration
+    with _LOCK:
+        _SPANS.append(s)
+        stat = _STATS.get((s.kind, s.name))
+        if stat is None:
+            stat = _STATS[(s.kind, s.name)] = _Stat()
+        stat.count += 1
+        stat.total += duration
+        stat.max = max(stat.max, duration)
+        if s.error:
+            stat.errors += 1
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                stat.buckets[i] += 1
+        for key, value in s.attrs.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                stat.counters[key] = stat.counters.get(key, 0) + value
+
+
+def traced(kind, name=None):
+    """Decorator form of span(); the name defaults to the function's name."""
+    def wrap(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(kind, label, None, _CURRENT.get()):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def trace_tools(tools):
+    """Rebuild @tool objects so each call is a 'tool' span with its output size."""
+    from langchain_core.tools import StructuredTool
+
+    def wrapped(tool):
+        def run(**kwargs):
+            if not _enabled:
+                return tool.func(**kwargs)
+            with Span("tool", tool.name, None, _CURRENT.get()) as s:
+                result = tool.func(**kwargs)
+                s.set("output_chars", len(result) if isinstance(result, str) else 0)
+                return result
+        return StructuredTool.from_function(
+            func=run, name=tool.name, description=tool.description, args_schema=tool.args_schema
+        )
+    return [wrapped(tool) for tool in tools]
+
+
+# --- LLM steps (LangChain callback) ---
+_llm_handler = None
+
+
+def llm_callbacks():
+    """Callbacks to pass in the agent's config: [] while tracing is off."""
+    global _llm_handler
+    if not _enabled:
+        return []
+    if _llm_handler is None:
+        _llm_handler = _make_llm_handler()
+    return [_llm_handler]
+
+
+def _make_llm_handler():
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class LLMSpanHandler(BaseCallbackHandler):
+        """Times each chat-model call and records its token usage as an 'llm' span."""
+
+        def __init__(self):
+            self._started = {}   # run_id -> (perf start, model, parent span)
+            self._lock = threading.Lock()
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+            model = (metadata or {}).get("ls_model_name") or (serialized or {}).get("name") or "llm"
+            with self._lock:
+                self._started[run_id] = (time.perf_counter(), model, _CURRENT.get())
+
+        def _end(self, run_id, **attrs):
+            with self._lock:
+                started = self._started.pop(run_id, None)
+            if started is None or not _enabled:
+                return
+            t0, model, parent = started
+            duration = time.perf_counter() - t0
+            s = Span("llm", model, attrs, parent)
+            s.start -= duration
+            s.error = attrs.pop("error", None)
+            _finish(s, duration)
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            tokens_in = tokens_out = 0
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    tokens_in += usage.get("input_tokens", 0)
+                    tokens_out += usage.get("output_tokens", 0)
+            self._end(run_id, tokens_in=tokens_in, tokens_out=tokens_out)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self._end(run_id, error=f"{type(error).__name__}: {error}")
+
+    return LLMSpanHandler()
+
+
+# --- Reading the data ---
+def recent_spans(n=200):
+    with _LOCK:
+        return list(_SPANS)[-n:]
+
+
+def trace_spans(trace_id):
+    """Spans of one trace (e.g. a session's last turn), in start order."""
+    if not trace_id:
+        return []
+    return sorted((s for s in recent_spans(MAX_SPANS) if s.trace_id == trace_id), key=lambda s: s.start)
+
+
+def summary():
+    """Per (kind, name): count, mean/max seconds, errors and summed counters."""
+    with _LOCK:
+        return [
+            {
+                "kind": kind, "name": name, "count": stat.count,
+                "mean_ms": stat.total / stat.count * 1000, "max_ms": stat.max * 1000,
+                "errors": stat.errors, **stat.counters,
+            }
+            for (kind, name), stat in sorted(_STATS.items())
+        ]
+
+
+def reset():
+    with _LOCK:
+        _SPANS.clear()
+        _STATS.clear()
+
+
+# --- Other components' numbers ---
+# Modules that keep their own stats (the API call layer, the caches) register a
+# snapshot function; it is read on demand, whether or not tracing is enabled.
+def register_collector(name, collect, counters=(), label=None):
+    """
+    Export collect()'s numbers as assistant_<name>_<key>. collect() returns
+    {key: number}, or {label value: {key: number}} when `label` names the label.
+    Keys in `counters` only ever grow and are exported as counters; the rest are gauges.
+    """
+    _COLLECTORS[name] = (collect, label, frozenset(counters))
+
+
+def _collect():
+    """[(name, label, counters, [(label value, {key: number}), ...])] for every collector."""
+    out = []
+    for name, (collect, label, counters) in sorted(_COLLECTORS.items()):
+        snapshot = collect()
+        out.append((name, label, counters, sorted(snapshot.items()) if label else [(None, snapshot)]))
+    return out
+
+
+def component_stats():
+    """Per registered component: rows of its numbers (one per label value), for the sidebar."""
+    return {
+        name: [{**({label: value} if label else {}), **stats} for value, stats in rows]
+        for name, label, _, rows in _collect()
+    }
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def export_openmetrics():
+    """All aggregates in OpenMetrics text format."""
+    with _LOCK:
+        stats = sorted(_STATS.items())
+        snapshot = [((kind, name), stat.count, stat.total, stat.errors, list(stat.buckets), dict(stat.counters))
+                    for (kind, name), stat in stats]
+
+    lines = ["# TYPE assistant_span_seconds histogram", "# UNIT assistant_span_seconds seconds"]
+    for (kind, name), count, total, _, buckets, _ in snapshot:
+        labels = f'kind="{_label(kind)}",name="{_label(name)}"'
+        for bound, n in zip(LATENCY_BUCKETS, buckets):
+            lines.append(f'assistant_span_seconds_bucket{{{labels},le="{bound}"}} {n}')
+        lines.append(f'assistant_span_seconds_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f"assistant_span_seconds_count{{{labels}}} {count}")
+        lines.append(f"assistant_span_seconds_sum{{{labels}}} {total:.6f}")
+
+    lines.append("# TYPE assistant_span_errors counter")
+    for (kind, name), _, _, errors, _, _ in snapshot:
+        lines.append(f'assistant_span_errors_total{{kind="{_label(kind)}",name="{_label(name)}"}} {errors}')
+
+    counters = sorted({key for *_, c in snapshot for key in c})
+    for key in counters:
+        lines.append(f"# TYPE assistant_span_{key} counter")
+        for (kind, name), *_, c in snapshot:
+            if key in c:
+                lines.append(f'assistant_span_{key}_total{{kind="{_label(kind)}",name="{_label(name)}"}} {c[key]}')
+
+    for component, label, monotonic, rows in _collect():
+        for key in sorted({key for _, stats in rows for key in stats}):
+            metric = f"assistant_{component}_{key}"
+            counter = key in monotonic
+            lines.append(f"# TYPE {metric} {'counter' if counter else 'gauge'}")
+            for value, stats in rows:
+                if key in stats:
+                    labels = f'{{{label}="{_label(value)}"}}' if label else ""
+                    lines.append(f"{metric}{'_total' if counter else ''}{labels} {stats[key]}")
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+_server = None
+
+
+def start_metrics_server(port=METRICS_PORT):
+    """Serve export_openmetrics() at http://0.0.0.0:<port>/metrics from a daemon thread (once per process)."""
+    global _server
+    if _server is not None or not port:
+        return _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = export_openmetrics().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/openmetrics-text; version=1.0.0; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    _server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
@@ -1,5 +1,38 @@
+import os
+import uuid
 import streamlit as st
 
+# Local caches (Drive index, mail mirror, parsed docs) live here
+CACHE_DIR = os.environ.get(
+    "ASSISTANT_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "ai-personal-assistant")
+)
+
 def init_session():
     if "messages" not in st.session_state:
         st.session_state["messages"] = []
+    # Conversation thread for the agent's checkpointer (memory.py)
+    if "thread_id" not in st.session_state:
+        st.session_state["thread_id"] = uuid.uuid4().hex
+
+def cache_path(*parts):
+    """Path inside CACHE_DIR; parent directories are created on demand."""
+    path = os.path.join(CACHE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+def private_cache_path(*parts):
+    """
+    cache_path for users' private data: every directory below CACHE_DIR is
+    0700 and the file is created 0600 (SQLite gives its journals the same mode).
+    Modes are re-applied, so files from before this was used are tightened too.
+    """
+    directory = CACHE_DIR
+    for part in parts[:-1]:
+        directory = os.path.join(directory, part)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        os.chmod(directory, 0o700)
+    path = os.path.join(directory, parts[-1])
+    os.close(os.open(path, os.O_WRONLY | os.O_CREAT, 0o600))
+    os.chmod(path, 0o600)
+    return path